@@ -7,19 +7,44 @@ import logging
 from aiogram import Bot, Dispatcher
 from aiogram.fsm.storage.memory import MemoryStorage
 
+try:
+    import uvloop
+except ImportError:  # uvloop is not available on Windows
+    uvloop = None
+
 import config
 from config import get_token
-from dependencies import init_dependencies
+from dependencies import init_dependencies, close_dependencies, get_favorites
 from handlers import setup_routers
-from tasks import periodic_chapter_check, stop_periodic_check
+from tasks import (
+    flush_pending_users,
+    flush_pending_views,
+    periodic_chapter_check,
+    periodic_db_optimize,
+    periodic_image_cache_eviction,
+    periodic_user_flush,
+    stop_periodic_check,
+)
 from middlewares import ThrottlingMiddleware
+from utils import close_http_session, shutdown_executor
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Seconds a getUpdates call waits server-side for new updates
+POLLING_TIMEOUT = 50
+
 
 async def main() -> None:
     """Main entry point."""
+    loop = asyncio.get_running_loop()
+    logger.info(f"Event loop: {type(loop).__module__}.{type(loop).__name__}")
+    if uvloop is None:
+        logger.info("uvloop not installed, using the default asyncio event loop")
+    # Page decoding dominates chapter assembly; make a slow JPEG build visible
+    from PIL import features
+    logger.info(f"Pillow libjpeg-turbo: {features.check('libjpeg_turbo')}")
+    
     # Initialize dependencies
     init_dependencies()
     
@@ -33,37 +58,58 @@ async def main() -> None:
     dispatcher.message.middleware(ThrottlingMiddleware(rate_limit=0.5))
     dispatcher.callback_query.middleware(ThrottlingMiddleware(callback_limit=0.3))
     
-    # Get bot username for deep links
-    bot_info = await bot.get_me()
-    config.BOT_USERNAME = bot_info.username
-    logger.info(f"Bot username: @{config.BOT_USERNAME}")
-    
-    # Initialize Telethon for large file uploads (optional)
+    # Get bot username for deep links and initialize Telethon for large
+    # file uploads (optional); the two are independent, so run them together
     from telethon_client import init_telethon, close_telethon, is_telethon_available
     if is_telethon_available():
-        await init_telethon()
+        bot_info, _ = await asyncio.gather(bot.get_me(), init_telethon())
     else:
+        bot_info = await bot.get_me()
         logger.info("Telethon not configured (API_ID/API_HASH missing). Large files will be compressed.")
+    config.BOT_USERNAME = bot_info.username
+    logger.info(f"Bot username: @{config.BOT_USERNAME}")
     
     # Include routers
     dispatcher.include_router(setup_routers())
     
     # Start background task for chapter notifications
     chapter_check_task = asyncio.create_task(periodic_chapter_check(bot, interval_seconds=3600))
+    cache_eviction_task = asyncio.create_task(periodic_image_cache_eviction(interval_seconds=3600))
+    user_flush_task = asyncio.create_task(periodic_user_flush())
+    db_optimize_task = asyncio.create_task(periodic_db_optimize())
     
     logger.info("Starting bot...")
     try:
-        await dispatcher.start_polling(bot)
+        # Long-poll for only the update types the routers handle
+        await dispatcher.start_polling(
+            bot,
+            polling_timeout=POLLING_TIMEOUT,
+            allowed_updates=dispatcher.resolve_used_update_types(),
+        )
     finally:
         stop_periodic_check()
-        chapter_check_task.cancel()
         try:
-            await chapter_check_task
-        except asyncio.CancelledError:
+            # Returns at once unless a check is in progress; cancelled on timeout
+            await asyncio.wait_for(
+                asyncio.gather(chapter_check_task, cache_eviction_task, user_flush_task, db_optimize_task),
+                timeout=5,
+            )
+        except (asyncio.TimeoutError, asyncio.CancelledError):
             pass
+        # In case the flush task was cancelled above
+        await flush_pending_users()
+        await flush_pending_views()
         # Close Telethon connection
         await close_telethon()
+        await close_dependencies()
+        await close_http_session()
+        shutdown_executor()
+        # After the DB thread has drained its queued writes
+        get_favorites().close()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if uvloop is not None:
+        uvloop.run(main())
+    else:
+        asyncio.run(main())
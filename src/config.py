@@ -22,6 +22,10 @@ ADMIN_ID = int(os.getenv("ADMIN_ID", "0")) or None
 # Bot username (for deep links, set automatically on start or via env)
 BOT_USERNAME: str | None = os.getenv("BOT_USERNAME")
 
+# On-disk cache for downloaded page images (LRU-evicted above the size budget)
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "tg_desu", "imgs"))
+IMAGE_CACHE_MAX_MB = int(os.getenv("IMAGE_CACHE_MAX_MB", "2048"))
+
 # Popular manga genres (English names for API, Russian for UI)
 GENRES = {
     "Action": "Экшен",
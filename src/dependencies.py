@@ -4,6 +4,7 @@ from __future__ import annotations
 from desu_client import DesuClient
 from favorites import FavoritesStore
 from config import DESU_BASE_URL
+from utils import get_http_session
 
 # Global instances
 _client: DesuClient | None = None
@@ -13,10 +14,17 @@ _favorites: FavoritesStore | None = None
 def init_dependencies() -> None:
     """Initialize global dependencies."""
     global _client, _favorites
-    _client = DesuClient(DESU_BASE_URL)
+    # API calls share the image downloader's connection pool
+    _client = DesuClient(DESU_BASE_URL, session_factory=get_http_session)
     _favorites = FavoritesStore()
 
 
+async def close_dependencies() -> None:
+    """Release resources held by global dependencies."""
+    if _client is not None:
+        await _client.close()
+
+
 def get_client() -> DesuClient:
     """Get DesuClient instance."""
     if _client is None:
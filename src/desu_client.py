@@ -1,10 +1,22 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Any
-from urllib.parse import urljoin
+import asyncio
+import functools
+import json
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable
+from urllib.parse import urlencode, urljoin
 
-import requests
+import aiohttp
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:  # orjson is optional; stdlib json also parses raw bytes
+    _json_loads = json.loads
 
 
 @dataclass
@@ -27,17 +39,151 @@ class MangaDetail:
     rating: float | None
 
 
+def chapter_number(chapter: dict[str, Any]) -> Any:
+    """Raw chapter number from an API chapter dict (field name varies)."""
+    return chapter.get("ch") or chapter.get("chapter") or chapter.get("number")
+
+
+def chapter_title(chapter: dict[str, Any]) -> str:
+    """Format chapter title from API data."""
+    return _chapter_label(chapter_number(chapter), chapter.get("vol"), chapter.get("title"))
+
+
+@functools.lru_cache(maxsize=4096)
+def _chapter_label(number, vol, title) -> str:
+    """Build chapter label; memoized since the same chapters are re-rendered on every page flip."""
+    if number:
+        label = f"Ch.{number}"
+        if vol:
+            label = f"V{vol} {label}"
+        return label
+    return title or "Chapter"
+
+
+@dataclass
+class ChapterIndex:
+    """Lookup tables over a manga's chapter list, built once per fetched list."""
+    chapters: list[dict[str, Any]]
+    by_id: dict[Any, dict[str, Any]] = field(init=False, repr=False)  # first chapter per id
+    by_num: dict[str, dict[str, Any]] = field(init=False, repr=False)  # first chapter per number
+    num_keys: list[str] = field(init=False, repr=False)  # sorted, for prefix search
+    _rank: dict[str, int] = field(init=False, repr=False)  # list position of each number
+    ids: list[Any] = field(init=False, repr=False)  # chapter id per list position
+    labels: list[str] = field(init=False, repr=False)  # button label per list position
+    lo: float | None = field(init=False, default=None)  # lowest numeric chapter number
+    hi: float | None = field(init=False, default=None)  # highest numeric chapter number
+
+    def __post_init__(self) -> None:
+        # Parallel arrays so keyboard pages are plain slices, with no per-render parsing
+        self.ids = [ch.get("id") for ch in self.chapters]
+        self.labels = [chapter_title(ch) for ch in self.chapters]
+        self.by_id = {}
+        for ch in self.chapters:
+            self.by_id.setdefault(ch.get("id"), ch)
+        self.by_num = {}
+        for ch in self.chapters:
+            num = chapter_number(ch)
+            if not num:
+                continue
+            self.by_num.setdefault(str(num), ch)
+            try:
+                value = float(num)
+            except (TypeError, ValueError):
+                continue
+            if self.lo is None or value < self.lo:
+                self.lo = value
+            if self.hi is None or value > self.hi:
+                self.hi = value
+        self._rank = {key: i for i, key in enumerate(self.by_num)}
+        self.num_keys = sorted(self.by_num)
+
+    def find_by_number(self, text: str) -> dict[str, Any] | None:
+        """Chapter whose number equals text, else the first in list order starting with it."""
+        found = self.by_num.get(text)
+        if found is None:
+            lo = bisect_left(self.num_keys, text)
+            hi = bisect_left(self.num_keys, text + "\uffff", lo)
+            if lo < hi:
+                found = self.by_num[min(self.num_keys[lo:hi], key=self._rank.__getitem__)]
+        return found
+
+
+# Manga payloads (detail + chapter list) are reused for this long; one user
+# flow (details -> chapters -> goto -> download) hits the same manga repeatedly
+MANGA_CACHE_TTL = 600  # seconds
+MANGA_CACHE_SIZE = 512
+
+# Responses kept for ETag revalidation: a 304 reuses the stored parsed body
+ETAG_CACHE_SIZE = 512
+
+# Per request, so it also applies on a session shared with image downloads
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=20)
+
+
 class DesuClient:
-    def __init__(self, base_url: str) -> None:
+    def __init__(
+        self,
+        base_url: str,
+        session_factory: Callable[[], aiohttp.ClientSession] | None = None,
+    ) -> None:
         self.base_url = base_url.rstrip("/")
+        # manga_id -> (expires_at, payload), least recently used first
+        self._manga_cache: OrderedDict[int, tuple[float, dict[str, Any]]] = OrderedDict()
+        # manga_id -> payload request in flight
+        self._manga_inflight: dict[int, asyncio.Future] = {}
+        # manga_id -> index, rebuilt when the cached chapter list object changes
+        self._chapter_index: dict[int, ChapterIndex] = {}
+        # request key -> (ETag, parsed response), least recently used first
+        self._etags: OrderedDict[str, tuple[str, Any]] = OrderedDict()
+        # session_factory returns a session shared with other HTTP users and
+        # closed by its owner; without one, a private session is created on
+        # first request so it binds to the running event loop
+        self._session_factory = session_factory
+        self._session: aiohttp.ClientSession | None = None
 
-    def _request(self, path: str, params: dict[str, Any] | None = None) -> Any:
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session_factory is not None:
+            return self._session_factory()
+        if self._session is None or self._session.closed:
+            # One pooled session: keep-alive connections are reused across calls
+            connector = aiohttp.TCPConnector(
+                limit=64,
+                limit_per_host=32,
+                keepalive_timeout=60,
+                ttl_dns_cache=300,
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def _request(self, path: str, params: dict[str, Any] | None = None) -> Any:
         url = urljoin(f"{self.base_url}/", path.lstrip("/"))
-        response = requests.get(url, params=params, timeout=20)
-        response.raise_for_status()
-        return response.json()
+        key = f"{url}?{urlencode(sorted(params.items()))}" if params else url
+        cached = self._etags.get(key)
+        headers = {"If-None-Match": cached[0]} if cached else None
+        async with self._get_session().get(
+            url, params=params, headers=headers, timeout=REQUEST_TIMEOUT
+        ) as response:
+            if response.status == 304 and cached:
+                self._etags.move_to_end(key)
+                return cached[1]
+            response.raise_for_status()
+            # Parse raw bytes: skips aiohttp's charset detection and str decode
+            body = await response.read()
+            data = _json_loads(body) if body.strip() else None
+            etag = response.headers.get("ETag")
+        if etag:
+            self._etags[key] = (etag, data)
+            self._etags.move_to_end(key)
+            if len(self._etags) > ETAG_CACHE_SIZE:
+                self._etags.popitem(last=False)
+        return data
 
-    def search_manga(
+    async def search_manga(
         self,
         *,
         genres: list[str] | None = None,
@@ -57,7 +203,7 @@ class DesuClient:
         if is_new:
             params["order"] = "updated"
         params["limit"] = 20
-        data = self._request("/manga/api", params=params)
+        data = await self._request("/manga/api", params=params)
         # Debug: log response structure and params
         import logging
         logger = logging.getLogger(__name__)
@@ -90,9 +236,30 @@ class DesuClient:
             return genre.get("russian") or genre.get("name") or "Unknown"
         return str(genre)
 
-    def get_manga_detail(self, manga_id: int) -> MangaDetail:
-        raw = self._request(f"/manga/api/{manga_id}")
+    async def _get_manga_data(self, manga_id: int, use_cache: bool = True) -> dict[str, Any]:
+        """Fetch the manga payload shared by detail and chapter lookups, with a TTL cache."""
+        now = time.monotonic()
+        cached = self._manga_cache.get(manga_id)
+        if use_cache and cached and cached[0] > now:
+            self._manga_cache.move_to_end(manga_id)
+            return cached[1]
+        # Concurrent misses for the same manga share one request
+        fut = self._manga_inflight.get(manga_id)
+        if fut is None:
+            fut = asyncio.ensure_future(self._request(f"/manga/api/{manga_id}"))
+            self._manga_inflight[manga_id] = fut
+            fut.add_done_callback(lambda _: self._manga_inflight.pop(manga_id, None))
+        # Shield so one cancelled caller doesn't cancel the fetch for the others
+        raw = await asyncio.shield(fut)
         data = raw.get("response", raw) if isinstance(raw, dict) else raw
+        self._manga_cache[manga_id] = (now + MANGA_CACHE_TTL, data)
+        self._manga_cache.move_to_end(manga_id)
+        if len(self._manga_cache) > MANGA_CACHE_SIZE:
+            evicted_id, _ = self._manga_cache.popitem(last=False)
+            self._chapter_index.pop(evicted_id, None)
+        return data
+
+    def _parse_detail(self, data: dict[str, Any]) -> MangaDetail:
         return MangaDetail(
             id=data.get("id"),
             title=data.get("russian") or data.get("title") or "Untitled",
@@ -104,14 +271,31 @@ class DesuClient:
             rating=data.get("score"),
         )
 
-    def get_manga_chapters(self, manga_id: int) -> list[dict[str, Any]]:
-        raw = self._request(f"/manga/api/{manga_id}")
-        data = raw.get("response", raw) if isinstance(raw, dict) else raw
+    @staticmethod
+    def _parse_chapters(data: dict[str, Any]) -> list[dict[str, Any]]:
         chapters = data.get("chapters", {})
         return chapters.get("list", []) if isinstance(chapters, dict) else []
 
-    def get_chapter_pages(self, manga_id: int, chapter_id: int) -> list[dict[str, Any]]:
-        raw = self._request(f"/manga/api/{manga_id}/chapter/{chapter_id}")
+    async def get_manga_detail(self, manga_id: int) -> MangaDetail:
+        return self._parse_detail(await self._get_manga_data(manga_id))
+
+    async def get_manga_chapters(self, manga_id: int, use_cache: bool = True) -> list[dict[str, Any]]:
+        return self._parse_chapters(await self._get_manga_data(manga_id, use_cache))
+
+    async def get_manga_full(self, manga_id: int) -> tuple[MangaDetail, list[dict[str, Any]]]:
+        """Detail and chapter list from a single /manga/api/{id} payload."""
+        data = await self._get_manga_data(manga_id)
+        return self._parse_detail(data), self._parse_chapters(data)
+
+    async def get_chapter_pages(self, manga_id: int, chapter_id: int) -> list[dict[str, Any]]:
+        raw = await self._request(f"/manga/api/{manga_id}/chapter/{chapter_id}")
         data = raw.get("response", raw) if isinstance(raw, dict) else raw
         pages = data.get("pages", {})
         return pages.get("list", pages) if isinstance(pages, dict) else pages
+
+    async def get_chapter_index(self, manga_id: int) -> ChapterIndex:
+        chapters = await self.get_manga_chapters(manga_id)
+        index = self._chapter_index.get(manga_id)
+        if index is None or index.chapters is not chapters:
+            index = self._chapter_index[manga_id] = ChapterIndex(chapters)
+        return index
@@ -1,21 +1,155 @@
 from __future__ import annotations
 
+import contextlib
+import json
 import sqlite3
-from datetime import datetime
+import threading
+import time
+from bisect import bisect_right
+from collections import OrderedDict
 from pathlib import Path
-from typing import Iterable
+from typing import Iterable, Iterator
+
+try:
+    import orjson
+
+    def _json_dumps(value) -> str:
+        return orjson.dumps(value).decode()
+
+    _json_loads = orjson.loads
+except ImportError:  # orjson is optional
+    _json_dumps = json.dumps
+    _json_loads = json.loads
+
+
+# Profile stats are reused this long; reads and favorite changes drop the
+# user's entry at once, so the TTL only bounds the day counter's staleness
+PROFILE_CACHE_TTL = 30  # seconds
+
+# Users kept in each per-user cache; the least recently used are dropped
+USER_CACHE_SIZE = 10_000
+
+
+def _lru_get(cache: OrderedDict, key):
+    """Cached value for key (None on a miss), marking it most recently used."""
+    value = cache.get(key)
+    if value is not None:
+        cache.move_to_end(key)
+    return value
+
+
+def _lru_put(cache: OrderedDict, key, value):
+    """Store value under key, evicting the least recently used entry past USER_CACHE_SIZE."""
+    cache[key] = value
+    cache.move_to_end(key)
+    if len(cache) > USER_CACHE_SIZE:
+        cache.popitem(last=False)
+    return value
+
+
+# Chapters read needed for each rank after the first, and the rank labels
+_RANK_THRESHOLDS = (10, 50, 200, 500, 1000)
+_RANK_LABELS = (
+    "🌱 Новичок",
+    "📚 Начинающий",
+    "📖 Активный читатель",
+    "⭐ Опытный читатель",
+    "👑 Мастер чтения",
+    "🏆 Легенда манги",
+)
+
+# Stored in PRAGMA user_version once _ensure_schema has run; bump it whenever
+# a table or index is added so existing databases pick the change up
+SCHEMA_VERSION = 4
+
+# Composite-key tables looked up by their full key: stored WITHOUT ROWID the
+# rows live in the primary key b-tree, so a lookup is a single probe
+_WITHOUT_ROWID_TABLES = (
+    "favorites",
+    "reading_history",
+    "file_cache",
+    "manga_history",
+    "album_cache",
+    "volume_cache",
+)
 
 
 class FavoritesStore:
     def __init__(self, db_path: str = "favorites.db") -> None:
         self.db_path = Path(db_path)
+        # One long-lived connection, opened on first use. Callers run every
+        # method on the database thread (utils.run_db); only get_cached_file,
+        # get_cached_volume and cached_has, which read plain dicts, are called
+        # from the event loop. The lock keeps each method's statements and
+        # commit together should another thread use the store
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.RLock()
+        # user_id -> (favorites rows newest first, manga id set); filled on
+        # first read, dropped on add/remove so it never goes stale
+        self._favorites_cache: OrderedDict[int, tuple[list[tuple[int, str, str | None]], set[int]]] = OrderedDict()
+        # user_id -> setting, filled on first read and updated by the setters
+        self._format_cache: OrderedDict[int, str] = OrderedDict()
+        self._notifications_cache: OrderedDict[int, bool] = OrderedDict()
+        # user_id -> (limit, recent manga rows); dropped when the user opens a manga
+        self._recent_cache: OrderedDict[int, tuple[int, list[dict]]] = OrderedDict()
+        # user_id -> (expires_at, profile stats); expired entries are dropped when looked up
+        self._profile_cache: OrderedDict[int, tuple[float, dict]] = OrderedDict()
         self._ensure_schema()
+        # Uploaded file_ids, loaded once and kept in step with every write;
+        # checked on each download, so a hit never touches the database
+        self._file_ids: dict[tuple[int, int, str], str] = {}
+        self._volume_file_ids: dict[tuple[int, str, str], str] = {}
+        self._load_file_caches()
 
-    def _connect(self) -> sqlite3.Connection:
-        return sqlite3.connect(self.db_path)
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        # Per-connection tuning; journal_mode=WAL is persistent and set in _ensure_schema
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA mmap_size=268435456")
+        conn.execute("PRAGMA cache_size=-20000")  # ~20 MB page cache
+        return conn
+
+    @contextlib.contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Hold the shared connection; commits on success, rolls back on error."""
+        with self._lock:
+            if self._conn is None:
+                self._conn = self._open()
+            with self._conn:
+                yield self._conn
+
+    def close(self) -> None:
+        """Close the shared connection (it is reopened on next use)."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
 
     def _ensure_schema(self) -> None:
         with self._connect() as conn:
+            if conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION:
+                return
+            # Lets clear_old_errors hand freed pages back to the OS; takes effect
+            # at once on an empty database, on an existing one after the VACUUM below
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            # WAL lets reads proceed while a write is in progress
+            conn.execute("PRAGMA journal_mode=WAL")
+            # sqlite3 autocommits each DDL statement on its own; one explicit
+            # transaction (committed by _connect) makes the schema a single write.
+            # journal_mode can't change mid-transaction, so it goes first
+            conn.execute("BEGIN IMMEDIATE")
+            # Older databases created these as rowid tables; move them aside
+            # and copy the rows over once the new tables exist
+            rebuilt = []
+            for table in _WITHOUT_ROWID_TABLES:
+                sql = conn.execute(
+                    "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+                ).fetchone()
+                if sql and "WITHOUT ROWID" not in sql[0].upper():
+                    conn.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+                    rebuilt.append(table)
             # Users table with more info
             conn.execute(
                 """
@@ -26,10 +160,20 @@ class FavoritesStore:
                     last_name TEXT,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     last_active TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    is_blocked INTEGER DEFAULT 0
+                    is_blocked INTEGER DEFAULT 0,
+                    chapters_read INTEGER NOT NULL DEFAULT 0,
+                    favorites_count INTEGER NOT NULL DEFAULT 0,
+                    manga_read INTEGER NOT NULL DEFAULT 0
                 )
                 """
             )
+            # Profile counters, kept current by the triggers below; older
+            # databases get the columns here and are backfilled once
+            user_columns = {row[1] for row in conn.execute("PRAGMA table_info(users)")}
+            backfill_counters = "chapters_read" not in user_columns
+            for column in ("chapters_read", "favorites_count", "manga_read"):
+                if column not in user_columns:
+                    conn.execute(f"ALTER TABLE users ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0")
             # Favorites with timestamp
             conn.execute(
                 """
@@ -40,7 +184,7 @@ class FavoritesStore:
                     cover TEXT,
                     added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     PRIMARY KEY (user_id, manga_id)
-                )
+                ) WITHOUT ROWID
                 """
             )
             # Reading history - track which chapters user read
@@ -53,7 +197,7 @@ class FavoritesStore:
                     chapter_num TEXT,
                     read_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     PRIMARY KEY (user_id, manga_id, chapter_id)
-                )
+                ) WITHOUT ROWID
                 """
             )
             # File cache - store Telegram file_id to avoid re-uploading
@@ -67,7 +211,7 @@ class FavoritesStore:
                     file_name TEXT,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     PRIMARY KEY (manga_id, chapter_id, format)
-                )
+                ) WITHOUT ROWID
                 """
             )
             # User settings
@@ -90,7 +234,7 @@ class FavoritesStore:
                     cover TEXT,
                     viewed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     PRIMARY KEY (user_id, manga_id)
-                )
+                ) WITHOUT ROWID
                 """
             )
             # Track last known chapter count for notifications
@@ -113,10 +257,17 @@ class FavoritesStore:
                 """
             )
             # Error log table for debugging
+            # Older databases declared error_log.id AUTOINCREMENT, which costs a
+            # sqlite_sequence write per insert; rebuild the table without it
+            row = conn.execute(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'error_log'"
+            ).fetchone()
+            if row and "AUTOINCREMENT" in row[0].upper():
+                conn.execute("ALTER TABLE error_log RENAME TO error_log_old")
             conn.execute(
                 """
                 CREATE TABLE IF NOT EXISTS error_log (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    id INTEGER PRIMARY KEY,
                     error_type TEXT NOT NULL,
                     error_message TEXT NOT NULL,
                     context TEXT,
@@ -134,7 +285,7 @@ class FavoritesStore:
                     file_ids TEXT NOT NULL,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     PRIMARY KEY (manga_id, chapter_id, batch_index)
-                )
+                ) WITHOUT ROWID
                 """
             )
             # Volume cache - store file_ids for downloaded volumes
@@ -148,19 +299,118 @@ class FavoritesStore:
                     file_name TEXT,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     PRIMARY KEY (manga_id, volume, format)
-                )
+                ) WITHOUT ROWID
                 """
             )
+            for table in rebuilt:
+                columns = ", ".join(row[1] for row in conn.execute(f"PRAGMA table_info({table}_old)"))
+                conn.execute(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {table}_old")
+                conn.execute(f"DROP TABLE {table}_old")
             # Indexes for faster queries
             conn.execute("CREATE INDEX IF NOT EXISTS idx_favorites_user ON favorites(user_id)")
             conn.execute("CREATE INDEX IF NOT EXISTS idx_history_user ON reading_history(user_id)")
             conn.execute("CREATE INDEX IF NOT EXISTS idx_users_active ON users(last_active)")
             conn.execute("CREATE INDEX IF NOT EXISTS idx_file_cache ON file_cache(manga_id, chapter_id)")
             conn.execute("CREATE INDEX IF NOT EXISTS idx_manga_history_user ON manga_history(user_id, viewed_at)")
+            if row and "AUTOINCREMENT" in row[0].upper():
+                conn.execute(
+                    """
+                    INSERT INTO error_log (id, error_type, error_message, context, created_at)
+                    SELECT id, error_type, error_message, context, created_at FROM error_log_old
+                    """
+                )
+                conn.execute("DROP TABLE error_log_old")
             conn.execute("CREATE INDEX IF NOT EXISTS idx_error_log_time ON error_log(created_at)")
             conn.execute("CREATE INDEX IF NOT EXISTS idx_album_cache ON album_cache(manga_id, chapter_id)")
             conn.execute("CREATE INDEX IF NOT EXISTS idx_volume_cache ON volume_cache(manga_id, volume)")
+            # Match the hot lookups exactly: last read chapter per manga, active
+            # (unblocked) users, and followers of a manga for notifications
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_history_user_manga_read ON reading_history(user_id, manga_id, read_at DESC)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_users_active_unblocked ON users(last_active) WHERE is_blocked = 0"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_favorites_manga ON favorites(manga_id)")
+            # Upserts that hit an existing row fire UPDATE, not INSERT, so
+            # re-reading a chapter or re-adding a favorite counts nothing
+            conn.execute(
+                """
+                CREATE TRIGGER IF NOT EXISTS trg_history_insert AFTER INSERT ON reading_history
+                BEGIN
+                    INSERT OR IGNORE INTO users (user_id) VALUES (NEW.user_id);
+                    UPDATE users SET
+                        chapters_read = chapters_read + 1,
+                        manga_read = manga_read + NOT EXISTS (
+                            SELECT 1 FROM reading_history
+                            WHERE user_id = NEW.user_id AND manga_id = NEW.manga_id
+                                AND chapter_id != NEW.chapter_id
+                        )
+                    WHERE user_id = NEW.user_id;
+                END
+                """
+            )
+            conn.execute(
+                """
+                CREATE TRIGGER IF NOT EXISTS trg_history_delete AFTER DELETE ON reading_history
+                BEGIN
+                    UPDATE users SET
+                        chapters_read = chapters_read - 1,
+                        manga_read = manga_read - NOT EXISTS (
+                            SELECT 1 FROM reading_history
+                            WHERE user_id = OLD.user_id AND manga_id = OLD.manga_id
+                        )
+                    WHERE user_id = OLD.user_id;
+                END
+                """
+            )
+            conn.execute(
+                """
+                CREATE TRIGGER IF NOT EXISTS trg_favorites_insert AFTER INSERT ON favorites
+                BEGIN
+                    INSERT OR IGNORE INTO users (user_id) VALUES (NEW.user_id);
+                    UPDATE users SET favorites_count = favorites_count + 1
+                    WHERE user_id = NEW.user_id;
+                END
+                """
+            )
+            conn.execute(
+                """
+                CREATE TRIGGER IF NOT EXISTS trg_favorites_delete AFTER DELETE ON favorites
+                BEGIN
+                    UPDATE users SET favorites_count = favorites_count - 1
+                    WHERE user_id = OLD.user_id;
+                END
+                """
+            )
+            if backfill_counters:
+                conn.execute(
+                    """
+                    INSERT OR IGNORE INTO users (user_id)
+                    SELECT user_id FROM reading_history UNION SELECT user_id FROM favorites
+                    """
+                )
+                conn.execute(
+                    """
+                    UPDATE users SET
+                        chapters_read = (
+                            SELECT COUNT(*) FROM reading_history WHERE user_id = users.user_id
+                        ),
+                        manga_read = (
+                            SELECT COUNT(DISTINCT manga_id) FROM reading_history
+                            WHERE user_id = users.user_id
+                        ),
+                        favorites_count = (
+                            SELECT COUNT(*) FROM favorites WHERE user_id = users.user_id
+                        )
+                    """
+                )
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
             conn.commit()
+            # Databases created before auto_vacuum was set only switch over when
+            # rebuilt; a one-time VACUUM, outside the schema transaction
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:  # 2 = INCREMENTAL
+                conn.execute("VACUUM")
 
     # ========== User Methods ==========
     
@@ -187,6 +437,26 @@ class FavoritesStore:
             )
             conn.commit()
 
+    def add_users_bulk(self, users: dict[int, tuple[str | None, str | None, str | None]]) -> None:
+        """Track or update many users in one transaction.
+        
+        users maps user_id -> (username, first_name, last_name).
+        """
+        with self._connect() as conn:
+            conn.executemany(
+                """
+                INSERT INTO users (user_id, username, first_name, last_name, last_active)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(user_id) DO UPDATE SET
+                    username = COALESCE(excluded.username, username),
+                    first_name = COALESCE(excluded.first_name, first_name),
+                    last_name = COALESCE(excluded.last_name, last_name),
+                    last_active = CURRENT_TIMESTAMP
+                """,
+                [(user_id, *names) for user_id, names in users.items()],
+            )
+            conn.commit()
+
     def get_user_info(self, user_id: int) -> dict | None:
         """Get user info including registration date."""
         with self._connect() as conn:
@@ -206,66 +476,41 @@ class FavoritesStore:
 
     def get_user_profile_stats(self, user_id: int) -> dict:
         """Get comprehensive user statistics for profile."""
+        now = time.monotonic()
+        cached = _lru_get(self._profile_cache, user_id)
+        if cached:
+            if cached[0] > now:
+                return cached[1]
+            del self._profile_cache[user_id]
         with self._connect() as conn:
-            # Days since registration
-            reg_row = conn.execute(
-                "SELECT created_at FROM users WHERE user_id = ?", (user_id,)
-            ).fetchone()
-            
-            # Chapters read count
-            chapters_row = conn.execute(
-                "SELECT COUNT(*) FROM reading_history WHERE user_id = ?", (user_id,)
-            ).fetchone()
-            
-            # Favorites count
-            fav_row = conn.execute(
-                "SELECT COUNT(*) FROM favorites WHERE user_id = ?", (user_id,)
-            ).fetchone()
-            
-            # Unique manga read
-            manga_row = conn.execute(
-                "SELECT COUNT(DISTINCT manga_id) FROM reading_history WHERE user_id = ?", (user_id,)
+            # Counters are maintained on the users row by triggers
+            row = conn.execute(
+                """
+                SELECT CAST(julianday('now') - julianday(created_at) AS INTEGER),
+                    chapters_read, favorites_count, manga_read
+                FROM users WHERE user_id = ?
+                """,
+                (user_id,),
             ).fetchone()
-        
-        # Calculate days since registration
-        days_registered = 0
-        if reg_row and reg_row[0]:
-            try:
-                reg_date = datetime.fromisoformat(reg_row[0].replace('Z', '+00:00'))
-                days_registered = (datetime.now() - reg_date.replace(tzinfo=None)).days
-            except (ValueError, AttributeError):
-                days_registered = 0
-        
-        chapters_read = chapters_row[0] if chapters_row else 0
-        favorites_count = fav_row[0] if fav_row else 0
-        manga_read = manga_row[0] if manga_row else 0
+        days_registered, chapters_read, favorites_count, manga_read = row or (0, 0, 0, 0)
         
         # Determine rank based on chapters read
         rank = self._get_rank(chapters_read)
         
-        return {
-            "days_registered": days_registered,
+        stats = {
+            "days_registered": days_registered or 0,
             "chapters_read": chapters_read,
             "favorites_count": favorites_count,
             "manga_read": manga_read,
             "rank": rank,
         }
+        _lru_put(self._profile_cache, user_id, (now + PROFILE_CACHE_TTL, stats))
+        return stats
 
     @staticmethod
     def _get_rank(chapters_read: int) -> str:
         """Determine user rank based on chapters read."""
-        if chapters_read >= 1000:
-            return "🏆 Легенда манги"
-        elif chapters_read >= 500:
-            return "👑 Мастер чтения"
-        elif chapters_read >= 200:
-            return "⭐ Опытный читатель"
-        elif chapters_read >= 50:
-            return "📖 Активный читатель"
-        elif chapters_read >= 10:
-            return "📚 Начинающий"
-        else:
-            return "🌱 Новичок"
+        return _RANK_LABELS[bisect_right(_RANK_THRESHOLDS, chapters_read)]
 
     def get_all_users(self, include_blocked: bool = False) -> list[int]:
         """Get all tracked user IDs."""
@@ -310,12 +555,18 @@ class FavoritesStore:
         with self._connect() as conn:
             conn.execute(
                 """
-                INSERT OR REPLACE INTO favorites (user_id, manga_id, title, cover, added_at)
+                INSERT INTO favorites (user_id, manga_id, title, cover, added_at)
                 VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(user_id, manga_id) DO UPDATE SET
+                    title = excluded.title,
+                    cover = excluded.cover,
+                    added_at = CURRENT_TIMESTAMP
                 """,
                 (user_id, manga_id, title, cover),
             )
             conn.commit()
+        self._favorites_cache.pop(user_id, None)
+        self._profile_cache.pop(user_id, None)
 
     def remove(self, user_id: int, manga_id: int) -> None:
         with self._connect() as conn:
@@ -324,31 +575,35 @@ class FavoritesStore:
                 (user_id, manga_id),
             )
             conn.commit()
+        self._favorites_cache.pop(user_id, None)
+        self._profile_cache.pop(user_id, None)
+
+    def _get_user_favorites(self, user_id: int) -> tuple[list[tuple[int, str, str | None]], set[int]]:
+        """Cached favorites rows and manga id set for a user."""
+        cached = _lru_get(self._favorites_cache, user_id)
+        if cached is None:
+            with self._connect() as conn:
+                rows = conn.execute(
+                    "SELECT manga_id, title, cover FROM favorites WHERE user_id = ? ORDER BY added_at DESC",
+                    (user_id,),
+                ).fetchall()
+            cached = _lru_put(self._favorites_cache, user_id, (rows, {row[0] for row in rows}))
+        return cached
 
     def list(self, user_id: int) -> Iterable[tuple[int, str, str | None]]:
-        with self._connect() as conn:
-            rows = conn.execute(
-                "SELECT manga_id, title, cover FROM favorites WHERE user_id = ? ORDER BY added_at DESC",
-                (user_id,),
-            ).fetchall()
-        return rows
+        return list(self._get_user_favorites(user_id)[0])
 
     def has(self, user_id: int, manga_id: int) -> bool:
-        with self._connect() as conn:
-            row = conn.execute(
-                "SELECT 1 FROM favorites WHERE user_id = ? AND manga_id = ?",
-                (user_id, manga_id),
-            ).fetchone()
-        return row is not None
+        return manga_id in self._get_user_favorites(user_id)[1]
+
+    def cached_has(self, user_id: int, manga_id: int) -> bool | None:
+        """has() from the favorites cache alone; None if the user isn't cached."""
+        cached = self._favorites_cache.get(user_id)
+        return None if cached is None else manga_id in cached[1]
 
     def get_favorites_count(self, user_id: int) -> int:
         """Get number of favorites for a user."""
-        with self._connect() as conn:
-            row = conn.execute(
-                "SELECT COUNT(*) FROM favorites WHERE user_id = ?",
-                (user_id,)
-            ).fetchone()
-        return row[0] if row else 0
+        return len(self._get_user_favorites(user_id)[1])
 
     # ========== Reading History Methods ==========
 
@@ -359,21 +614,49 @@ class FavoritesStore:
         with self._connect() as conn:
             conn.execute(
                 """
-                INSERT OR REPLACE INTO reading_history (user_id, manga_id, chapter_id, chapter_num, read_at)
+                INSERT INTO reading_history (user_id, manga_id, chapter_id, chapter_num, read_at)
                 VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(user_id, manga_id, chapter_id) DO UPDATE SET
+                    chapter_num = excluded.chapter_num,
+                    read_at = CURRENT_TIMESTAMP
                 """,
                 (user_id, manga_id, chapter_id, chapter_num),
             )
             conn.commit()
+        self._profile_cache.pop(user_id, None)
+
+    def mark_chapters_read(
+        self, user_id: int, manga_id: int, chapters: list[tuple[int, str | None]]
+    ) -> None:
+        """Mark several chapters as read in one transaction.
+        
+        chapters is a list of (chapter_id, chapter_num).
+        """
+        with self._connect() as conn:
+            conn.executemany(
+                """
+                INSERT INTO reading_history (user_id, manga_id, chapter_id, chapter_num, read_at)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(user_id, manga_id, chapter_id) DO UPDATE SET
+                    chapter_num = excluded.chapter_num,
+                    read_at = CURRENT_TIMESTAMP
+                """,
+                [(user_id, manga_id, chapter_id, chapter_num) for chapter_id, chapter_num in chapters],
+            )
+            conn.commit()
+        self._profile_cache.pop(user_id, None)
 
     def get_read_chapters(self, user_id: int, manga_id: int) -> list[int]:
         """Get list of read chapter IDs for a manga."""
         with self._connect() as conn:
-            rows = conn.execute(
-                "SELECT chapter_id FROM reading_history WHERE user_id = ? AND manga_id = ?",
-                (user_id, manga_id),
-            ).fetchall()
-        return [row[0] for row in rows]
+            # Built straight off the cursor, with no intermediate row list
+            return [
+                row[0]
+                for row in conn.execute(
+                    "SELECT chapter_id FROM reading_history WHERE user_id = ? AND manga_id = ?",
+                    (user_id, manga_id),
+                )
+            ]
 
     def get_last_read_chapter(self, user_id: int, manga_id: int) -> int | None:
         """Get the last read chapter ID for a manga."""
@@ -393,13 +676,16 @@ class FavoritesStore:
     def get_stats(self) -> dict:
         """Get overall bot statistics."""
         with self._connect() as conn:
-            total_users = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
-            active_users = conn.execute(
-                "SELECT COUNT(*) FROM users WHERE last_active >= datetime('now', '-7 days')"
-            ).fetchone()[0]
-            total_favorites = conn.execute("SELECT COUNT(*) FROM favorites").fetchone()[0]
-            total_reads = conn.execute("SELECT COUNT(*) FROM reading_history").fetchone()[0]
-            cached_files = conn.execute("SELECT COUNT(*) FROM file_cache").fetchone()[0]
+            total_users, active_users, total_favorites, total_reads, cached_files = conn.execute(
+                """
+                SELECT
+                    (SELECT COUNT(*) FROM users),
+                    (SELECT COUNT(*) FROM users WHERE last_active >= datetime('now', '-7 days')),
+                    (SELECT COUNT(*) FROM favorites),
+                    (SELECT COUNT(*) FROM reading_history),
+                    (SELECT COUNT(*) FROM file_cache)
+                """
+            ).fetchone()
         return {
             "total_users": total_users,
             "active_users_7d": active_users,
@@ -410,24 +696,39 @@ class FavoritesStore:
 
     # ========== File Cache Methods ==========
 
+    def _load_file_caches(self) -> None:
+        with self._connect() as conn:
+            self._file_ids = {
+                (manga_id, chapter_id, format): file_id
+                for manga_id, chapter_id, format, file_id in conn.execute(
+                    "SELECT manga_id, chapter_id, format, file_id FROM file_cache"
+                )
+            }
+            self._volume_file_ids = {
+                (manga_id, volume, format): file_id
+                for manga_id, volume, format, file_id in conn.execute(
+                    "SELECT manga_id, volume, format, file_id FROM volume_cache"
+                )
+            }
+
     def get_cached_file(self, manga_id: int, chapter_id: int, format: str) -> str | None:
         """Get cached Telegram file_id if exists."""
-        with self._connect() as conn:
-            row = conn.execute(
-                "SELECT file_id FROM file_cache WHERE manga_id = ? AND chapter_id = ? AND format = ?",
-                (manga_id, chapter_id, format),
-            ).fetchone()
-        return row[0] if row else None
+        return self._file_ids.get((manga_id, chapter_id, format))
 
     def cache_file(
         self, manga_id: int, chapter_id: int, format: str, file_id: str, file_name: str | None = None
     ) -> None:
         """Cache a Telegram file_id for a chapter."""
+        self._file_ids[(manga_id, chapter_id, format)] = file_id
         with self._connect() as conn:
             conn.execute(
                 """
-                INSERT OR REPLACE INTO file_cache (manga_id, chapter_id, format, file_id, file_name, created_at)
+                INSERT INTO file_cache (manga_id, chapter_id, format, file_id, file_name, created_at)
                 VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(manga_id, chapter_id, format) DO UPDATE SET
+                    file_id = excluded.file_id,
+                    file_name = excluded.file_name,
+                    created_at = CURRENT_TIMESTAMP
                 """,
                 (manga_id, chapter_id, format, file_id, file_name),
             )
@@ -438,8 +739,10 @@ class FavoritesStore:
         with self._connect() as conn:
             if manga_id:
                 cursor = conn.execute("DELETE FROM file_cache WHERE manga_id = ?", (manga_id,))
+                self._file_ids = {key: value for key, value in self._file_ids.items() if key[0] != manga_id}
             else:
                 cursor = conn.execute("DELETE FROM file_cache")
+                self._file_ids = {}
             conn.commit()
             return cursor.rowcount
 
@@ -447,22 +750,22 @@ class FavoritesStore:
 
     def get_cached_volume(self, manga_id: int, volume: str, format: str) -> str | None:
         """Get cached Telegram file_id for a volume if exists."""
-        with self._connect() as conn:
-            row = conn.execute(
-                "SELECT file_id FROM volume_cache WHERE manga_id = ? AND volume = ? AND format = ?",
-                (manga_id, volume, format),
-            ).fetchone()
-        return row[0] if row else None
+        return self._volume_file_ids.get((manga_id, volume, format))
 
     def cache_volume(
         self, manga_id: int, volume: str, format: str, file_id: str, file_name: str | None = None
     ) -> None:
         """Cache a Telegram file_id for a volume."""
+        self._volume_file_ids[(manga_id, volume, format)] = file_id
         with self._connect() as conn:
             conn.execute(
                 """
-                INSERT OR REPLACE INTO volume_cache (manga_id, volume, format, file_id, file_name, created_at)
+                INSERT INTO volume_cache (manga_id, volume, format, file_id, file_name, created_at)
                 VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(manga_id, volume, format) DO UPDATE SET
+                    file_id = excluded.file_id,
+                    file_name = excluded.file_name,
+                    created_at = CURRENT_TIMESTAMP
                 """,
                 (manga_id, volume, format, file_id, file_name),
             )
@@ -473,8 +776,12 @@ class FavoritesStore:
         with self._connect() as conn:
             if manga_id:
                 cursor = conn.execute("DELETE FROM volume_cache WHERE manga_id = ?", (manga_id,))
+                self._volume_file_ids = {
+                    key: value for key, value in self._volume_file_ids.items() if key[0] != manga_id
+                }
             else:
                 cursor = conn.execute("DELETE FROM volume_cache")
+                self._volume_file_ids = {}
             conn.commit()
             return cursor.rowcount
 
@@ -482,26 +789,35 @@ class FavoritesStore:
 
     def get_cached_album(self, manga_id: int, chapter_id: int) -> list[list[str]] | None:
         """Get cached album file_ids. Returns list of batches, each batch is list of file_ids."""
-        import json
         with self._connect() as conn:
-            rows = conn.execute(
-                "SELECT batch_index, file_ids FROM album_cache WHERE manga_id = ? AND chapter_id = ? ORDER BY batch_index",
+            # Each batch is a JSON array; join them into one array of batches
+            # so the album comes back as a single row and a single parse
+            row = conn.execute(
+                """
+                SELECT '[' || group_concat(file_ids, ',') || ']' FROM (
+                    SELECT file_ids FROM album_cache
+                    WHERE manga_id = ? AND chapter_id = ?
+                    ORDER BY batch_index
+                )
+                """,
                 (manga_id, chapter_id),
-            ).fetchall()
-        if not rows:
+            ).fetchone()
+        if row[0] is None:
             return None
-        return [json.loads(row[1]) for row in rows]
+        return _json_loads(row[0])
 
     def cache_album_batch(self, manga_id: int, chapter_id: int, batch_index: int, file_ids: list[str]) -> None:
         """Cache a batch of album file_ids."""
-        import json
         with self._connect() as conn:
             conn.execute(
                 """
-                INSERT OR REPLACE INTO album_cache (manga_id, chapter_id, batch_index, file_ids, created_at)
+                INSERT INTO album_cache (manga_id, chapter_id, batch_index, file_ids, created_at)
                 VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(manga_id, chapter_id, batch_index) DO UPDATE SET
+                    file_ids = excluded.file_ids,
+                    created_at = CURRENT_TIMESTAMP
                 """,
-                (manga_id, chapter_id, batch_index, json.dumps(file_ids)),
+                (manga_id, chapter_id, batch_index, _json_dumps(file_ids)),
             )
             conn.commit()
 
@@ -529,12 +845,16 @@ class FavoritesStore:
 
     def get_download_format(self, user_id: int) -> str:
         """Get user's preferred download format. Default is 'pdf'."""
+        cached = _lru_get(self._format_cache, user_id)
+        if cached is not None:
+            return cached
         with self._connect() as conn:
             row = conn.execute(
                 "SELECT download_format FROM user_settings WHERE user_id = ?",
                 (user_id,),
             ).fetchone()
-        return row[0] if row else "pdf"
+        format = _lru_put(self._format_cache, user_id, row[0] if row else "pdf")
+        return format
 
     def set_download_format(self, user_id: int, format: str) -> None:
         """Set user's preferred download format ('pdf' or 'zip')."""
@@ -552,6 +872,7 @@ class FavoritesStore:
                 (user_id, format),
             )
             conn.commit()
+        _lru_put(self._format_cache, user_id, format)
 
     # ========== Manga History Methods ==========
 
@@ -570,11 +891,37 @@ class FavoritesStore:
                 (user_id, manga_id, title, cover),
             )
             conn.commit()
+        self._recent_cache.pop(user_id, None)
+
+    def add_manga_views_bulk(self, views: dict[tuple[int, int], tuple[str, str | None, float]]) -> None:
+        """Record many manga views in one transaction.
+        
+        views maps (user_id, manga_id) -> (title, cover, viewed_at as a Unix timestamp).
+        """
+        with self._connect() as conn:
+            conn.executemany(
+                """
+                INSERT INTO manga_history (user_id, manga_id, title, cover, viewed_at)
+                VALUES (?, ?, ?, ?, datetime(?, 'unixepoch'))
+                ON CONFLICT(user_id, manga_id) DO UPDATE SET 
+                    title = excluded.title,
+                    cover = excluded.cover,
+                    viewed_at = excluded.viewed_at
+                """,
+                [(user_id, manga_id, *view) for (user_id, manga_id), view in views.items()],
+            )
+            conn.commit()
+        for user_id, _ in views:
+            self._recent_cache.pop(user_id, None)
 
     def get_recent_manga(self, user_id: int, limit: int = 10) -> list[dict]:
         """Get user's recently viewed manga."""
+        # History pages flip over the same list; a longer cached one serves too
+        cached = _lru_get(self._recent_cache, user_id)
+        if cached and cached[0] >= limit:
+            return cached[1][:limit]
         with self._connect() as conn:
-            rows = conn.execute(
+            cursor = conn.execute(
                 """
                 SELECT manga_id, title, cover, viewed_at 
                 FROM manga_history 
@@ -583,11 +930,25 @@ class FavoritesStore:
                 LIMIT ?
                 """,
                 (user_id, limit),
+            )
+            recent = [
+                {"manga_id": manga_id, "title": title, "cover": cover, "viewed_at": viewed_at}
+                for manga_id, title, cover, viewed_at in cursor
+            ]
+        _lru_put(self._recent_cache, user_id, (limit, recent))
+        return recent
+
+    def get_known_manga_ids(self) -> list[int]:
+        """Get IDs of every manga the bot has seen: viewed, favorited or tracked."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                """
+                SELECT manga_id FROM manga_history
+                UNION SELECT manga_id FROM favorites
+                UNION SELECT manga_id FROM manga_chapter_count
+                """
             ).fetchall()
-        return [
-            {"manga_id": row[0], "title": row[1], "cover": row[2], "viewed_at": row[3]}
-            for row in rows
-        ]
+        return [row[0] for row in rows]
 
     # ========== Chapter Count Tracking (for notifications) ==========
 
@@ -615,6 +976,27 @@ class FavoritesStore:
             )
             conn.commit()
 
+    def get_all_manga_chapter_counts(self) -> dict[int, int]:
+        """Get last known chapter counts for all tracked manga."""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT manga_id, chapter_count FROM manga_chapter_count").fetchall()
+        return dict(rows)
+
+    def set_manga_chapter_counts(self, counts: dict[int, int]) -> None:
+        """Update chapter counts for many manga in one transaction."""
+        with self._connect() as conn:
+            conn.executemany(
+                """
+                INSERT INTO manga_chapter_count (manga_id, chapter_count, last_checked)
+                VALUES (?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(manga_id) DO UPDATE SET 
+                    chapter_count = excluded.chapter_count,
+                    last_checked = CURRENT_TIMESTAMP
+                """,
+                counts.items(),
+            )
+            conn.commit()
+
     def get_all_favorite_manga_ids(self) -> list[tuple[int, int, str]]:
         """Get all unique manga IDs from favorites with user_id and title."""
         with self._connect() as conn:
@@ -636,12 +1018,24 @@ class FavoritesStore:
 
     def is_notifications_enabled(self, user_id: int) -> bool:
         """Check if user has notifications enabled."""
+        cached = _lru_get(self._notifications_cache, user_id)
+        if cached is not None:
+            return cached
         with self._connect() as conn:
             row = conn.execute(
                 "SELECT notifications_enabled FROM notification_settings WHERE user_id = ?",
                 (user_id,),
             ).fetchone()
-        return row[0] == 1 if row else True  # Default enabled
+        enabled = _lru_put(self._notifications_cache, user_id, row[0] == 1 if row else True)  # Default enabled
+        return enabled
+
+    def get_notifications_disabled_users(self) -> set[int]:
+        """Get IDs of all users who turned notifications off."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT user_id FROM notification_settings WHERE notifications_enabled = 0"
+            ).fetchall()
+        return {row[0] for row in rows}
 
     def set_notifications_enabled(self, user_id: int, enabled: bool) -> None:
         """Enable or disable notifications for user."""
@@ -655,6 +1049,7 @@ class FavoritesStore:
                 (user_id, 1 if enabled else 0),
             )
             conn.commit()
+        _lru_put(self._notifications_cache, user_id, enabled)
 
     # ========== Error Logging ==========
 
@@ -701,4 +1096,22 @@ class FavoritesStore:
                 (f"-{days} days",),
             )
             conn.commit()
+            # Hand up to 1000 freed pages back (_ensure_schema sets
+            # auto_vacuum=INCREMENTAL). execute() would stop after the
+            # pragma's first step (one page), executescript runs it to the end
+            conn.executescript("PRAGMA incremental_vacuum(1000)")
             return cursor.rowcount
+
+    def optimize(self) -> None:
+        """Refresh query planner statistics where SQLite deems it worthwhile."""
+        with self._connect() as conn:
+            conn.execute("PRAGMA optimize")
+
+    def backup(self, dest_path: str | Path) -> None:
+        """Write a consistent copy of the database, WAL contents included, to dest_path."""
+        dest = sqlite3.connect(dest_path)
+        try:
+            with self._connect() as conn:
+                conn.backup(dest)
+        finally:
+            dest.close()
@@ -1,6 +1,8 @@
 """Handlers package."""
 from aiogram import Router
 
+from dependencies import get_client, get_favorites
+from . import admin, base, manga, search
 from .base import router as base_router
 from .search import router as search_router
 from .manga import router as manga_router
@@ -9,6 +11,14 @@ from .admin import router as admin_router
 
 def setup_routers() -> Router:
     """Setup and return main router with all handlers."""
+    # Bind dependencies once here instead of looking them up on every update
+    client = get_client()
+    store = get_favorites()
+    base.client, base.store = client, store
+    search.client = client
+    manga.client, manga.store = client, store
+    admin.store = store
+
     main_router = Router()
     main_router.include_router(base_router)
     main_router.include_router(search_router)
@@ -2,30 +2,40 @@
 from __future__ import annotations
 
 import asyncio
+import contextlib
 import logging
 import os
+import tempfile
 
 from aiogram import F, Router
+from aiogram.exceptions import TelegramRetryAfter
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.types import CallbackQuery, FSInputFile, InlineKeyboardButton, InlineKeyboardMarkup, Message
 
 from config import is_admin
 from keyboards import MAIN_MENU
-from states import BroadcastStates
-from dependencies import get_favorites
-from utils import safe_callback_answer
+from states import SEARCH_STATE, BroadcastStates
+from favorites import FavoritesStore
+from utils import SEND_LIMITER, ack_callback, run_db
 
 logger = logging.getLogger(__name__)
 
 router = Router()
 
+# Bound by handlers.setup_routers() once dependencies are initialized
+store: FavoritesStore
+
+# admin id -> content awaiting confirmation; FSM storage only tracks the step
+_pending_broadcast: dict[int, dict[str, str]] = {}
+
 
 @router.message(Command("cancel"))
 async def cmd_cancel(message: Message, state: FSMContext) -> None:
     """Cancel current operation."""
     current_state = await state.get_state()
-    if current_state:
+    if SEARCH_STATE.pop(message.from_user.id, None) or current_state:
+        _pending_broadcast.pop(message.from_user.id, None)
         await state.clear()
         await message.answer("Операция отменена.", reply_markup=MAIN_MENU)
     else:
@@ -39,8 +49,7 @@ async def cmd_stats(message: Message) -> None:
         await message.answer("❌ У вас нет прав для использования этой команды.")
         return
     
-    store = get_favorites()
-    stats = store.get_stats()
+    stats = await run_db(store.get_stats)
     
     await message.answer(
         f"📊 Статистика бота\n\n"
@@ -60,9 +69,9 @@ async def cmd_broadcast(message: Message, state: FSMContext) -> None:
         await message.answer("❌ У вас нет прав для использования этой команды.")
         return
     
-    store = get_favorites()
-    user_count = store.get_user_count()
+    user_count = await run_db(store.get_user_count)
     
+    SEARCH_STATE.pop(message.from_user.id, None)
     await state.set_state(BroadcastStates.waiting_content)
     await message.answer(
         f"📢 Режим рассылки\n\n"
@@ -83,16 +92,16 @@ async def handle_broadcast_content(message: Message, state: FSMContext) -> None:
         return
     
     if message.photo:
-        await state.update_data(
-            content_type="photo",
-            photo_id=message.photo[-1].file_id,
-            caption=message.caption or ""
-        )
+        _pending_broadcast[message.from_user.id] = {
+            "content_type": "photo",
+            "photo_id": message.photo[-1].file_id,
+            "caption": message.caption or "",
+        }
     elif message.text:
-        await state.update_data(
-            content_type="text",
-            text=message.text
-        )
+        _pending_broadcast[message.from_user.id] = {
+            "content_type": "text",
+            "text": message.text,
+        }
     else:
         await message.answer("❌ Пожалуйста, отправьте текст или фото с подписью.")
         return
@@ -106,8 +115,7 @@ async def handle_broadcast_content(message: Message, state: FSMContext) -> None:
         ]
     ])
     
-    store = get_favorites()
-    user_count = store.get_user_count()
+    user_count = await run_db(store.get_user_count)
     
     await message.answer(
         f"📢 Готово к рассылке {user_count} пользователям.\n\nПодтвердить?",
@@ -116,10 +124,24 @@ async def handle_broadcast_content(message: Message, state: FSMContext) -> None:
     )
 
 
+# Broadcast pacing: Telegram allows about 30 messages/s to different users
+BROADCAST_CONCURRENCY = 25
+BROADCAST_RETRIES = 3  # attempts per user when hitting flood control
+BROADCAST_PROGRESS_INTERVAL = 3.0  # seconds between progress edits
+
+
+async def _edit_progress(message: Message, text: str) -> None:
+    """Update a progress message, ignoring edit failures."""
+    try:
+        await message.edit_text(text)
+    except Exception:
+        pass
+
+
 @router.callback_query(F.data == "broadcast:confirm")
 async def confirm_broadcast(callback: CallbackQuery, state: FSMContext) -> None:
     """Confirm and send broadcast."""
-    await safe_callback_answer(callback)
+    ack_callback(callback)
     
     if not is_admin(callback.from_user.id):
         await state.clear()
@@ -128,38 +150,68 @@ async def confirm_broadcast(callback: CallbackQuery, state: FSMContext) -> None:
     if not callback.message:
         return
     
-    data = await state.get_data()
+    data = _pending_broadcast.pop(callback.from_user.id, None)
     await state.clear()
     
-    content_type = data.get("content_type")
-    if not content_type:
+    if not data:
         await callback.message.edit_text("❌ Нет содержимого для рассылки.")
         return
     
-    store = get_favorites()
-    users = store.get_all_users()
+    users = await run_db(store.get_all_users)
     
     await callback.message.edit_text(f"📤 Рассылка {len(users)} пользователям...")
     
-    success = 0
-    failed = 0
+    semaphore = asyncio.Semaphore(BROADCAST_CONCURRENCY)
+    done = 0
     
-    for user_id in users:
+    async def send_one(user_id: int) -> bool:
+        nonlocal done
         try:
-            if content_type == "photo":
-                await callback.bot.send_photo(
-                    user_id,
-                    photo=data["photo_id"],
-                    caption=data.get("caption", "")
-                )
-            else:
-                await callback.bot.send_message(user_id, data["text"])
-            success += 1
-        except Exception as e:
-            logger.error(f"Failed to send to {user_id}: {e}")
-            failed += 1
-        
-        await asyncio.sleep(0.05)
+            async with semaphore:
+                for _ in range(BROADCAST_RETRIES):
+                    # Shares the bot-wide budget, so uploads running during a
+                    # broadcast don't push the total past Telegram's limit
+                    await SEND_LIMITER.acquire()
+                    try:
+                        if data["content_type"] == "photo":
+                            await callback.bot.send_photo(
+                                user_id,
+                                photo=data["photo_id"],
+                                caption=data.get("caption", "")
+                            )
+                        else:
+                            await callback.bot.send_message(user_id, data["text"])
+                        return True
+                    except TelegramRetryAfter as e:
+                        await asyncio.sleep(e.retry_after)
+                    except Exception as e:
+                        logger.error(f"Failed to send to {user_id}: {e}")
+                        return False
+                logger.error(f"Failed to send to {user_id}: still rate limited")
+                return False
+        finally:
+            done += 1
+    
+    async def report_progress() -> None:
+        # Edits on a timer rather than per send: a chat's message allows about
+        # one edit per second, however many users the broadcast goes to
+        reported = 0
+        while True:
+            await asyncio.sleep(BROADCAST_PROGRESS_INTERVAL)
+            if done != reported:
+                reported = done
+                await _edit_progress(callback.message, f"📤 Рассылка: {done}/{len(users)}...")
+    
+    progress_task = asyncio.create_task(report_progress())
+    try:
+        results = await asyncio.gather(*(send_one(user_id) for user_id in users))
+    finally:
+        progress_task.cancel()
+        # Let an in-flight edit settle so it can't land after the summary
+        with contextlib.suppress(asyncio.CancelledError):
+            await progress_task
+    success = sum(results)
+    failed = len(results) - success
     
     await callback.message.edit_text(
         f"✅ Рассылка завершена!\n\n"
@@ -173,6 +225,7 @@ async def confirm_broadcast(callback: CallbackQuery, state: FSMContext) -> None:
 async def cancel_broadcast(callback: CallbackQuery, state: FSMContext) -> None:
     """Cancel broadcast."""
     await callback.answer("Рассылка отменена.")
+    _pending_broadcast.pop(callback.from_user.id, None)
     await state.clear()
     if callback.message:
         await callback.message.edit_text("❌ Рассылка отменена.")
@@ -185,15 +238,19 @@ async def cmd_backup(message: Message) -> None:
         await message.answer("❌ У вас нет прав для использования этой команды.")
         return
     
-    store = get_favorites()
     db_path = str(store.db_path)
     
     if not os.path.exists(db_path):
         await message.answer("❌ Файл базы данных не найден.")
         return
     
+    fd, backup_path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
     try:
-        db_file = FSInputFile(db_path, filename="favorites_backup.db")
+        # Online backup: a consistent snapshot with the WAL tail, taken
+        # while other writes keep going
+        await run_db(store.backup, backup_path)
+        db_file = FSInputFile(backup_path, filename="favorites_backup.db")
         await message.answer_document(
             db_file,
             caption=f"🗄 Резервная копия базы данных\n📅 {__import__('datetime').datetime.now().strftime('%Y-%m-%d %H:%M')}"
@@ -201,6 +258,8 @@ async def cmd_backup(message: Message) -> None:
     except Exception as e:
         logger.error(f"Backup failed: {e}")
         await message.answer(f"❌ Ошибка резервного копирования: {e}")
+    finally:
+        os.unlink(backup_path)
 
 
 @router.message(Command("errors"))
@@ -210,8 +269,7 @@ async def cmd_errors(message: Message) -> None:
         await message.answer("❌ У вас нет прав для использования этой команды.")
         return
     
-    store = get_favorites()
-    errors = store.get_recent_errors(limit=20)
+    errors = await run_db(store.get_recent_errors, limit=20)
     
     if not errors:
         await message.answer("✅ Нет зарегистрированных ошибок.")
@@ -238,8 +296,7 @@ async def clear_errors(callback: CallbackQuery) -> None:
         await callback.answer("❌ Доступ запрещен.")
         return
     
-    store = get_favorites()
-    deleted = store.clear_old_errors(days=7)
+    deleted = await run_db(store.clear_old_errors, days=7)
     
     await callback.answer(f"✅ Удалено {deleted} старых ошибок")
     await callback.message.edit_text(f"✅ Очистка {deleted} ошибок старше 7 дней.")
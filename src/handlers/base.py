@@ -1,8 +1,12 @@
 """Base handlers: start, profile, catalog, search menu."""
 from __future__ import annotations
 
+import asyncio
 import os
+import random
+import re
 import sys
+import time
 
 # Add parent directory to path for imports when running directly
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -22,13 +26,25 @@ from keyboards import (
     build_settings_keyboard,
     build_manga_buttons,
 )
-from dependencies import get_favorites, get_client
-from utils import run_sync, format_manga_detail, safe_callback_answer
+from desu_client import DesuClient
+from favorites import FavoritesStore
+from tasks import track_manga_view, track_user
+from utils import ack_callback, format_manga_detail, is_in_favorites, run_db, safe_callback_answer
 
 router = Router()
 
+# Bound by handlers.setup_routers() once dependencies are initialized
+store: FavoritesStore
+client: DesuClient
+
 # Path to menu images
 MENU_IMAGES_DIR = os.path.join(os.path.dirname(__file__), "..", "menu")
+# The menu folder doesn't change at runtime; scan it once instead of per menu open
+MENU_IMAGES = [
+    path
+    for path in (os.path.join(MENU_IMAGES_DIR, f"{i}.jpg") for i in range(1, 6))
+    if os.path.exists(path)
+]
 
 WELCOME_GUIDE = """
 🎌 <b>Добро пожаловать в Desu Manga Bot!</b>
@@ -63,42 +79,88 @@ WELCOME_GUIDE = """
 
 def get_random_menu_image() -> str | None:
     """Get a random image from menu folder."""
-    import random
-    image_files = []
-    for i in range(1, 6):
-        img_path = os.path.join(MENU_IMAGES_DIR, f"{i}.jpg")
-        if os.path.exists(img_path):
-            image_files.append(img_path)
-    return random.choice(image_files) if image_files else None
+    return random.choice(MENU_IMAGES) if MENU_IMAGES else None
+
+
+# Menu image path -> Telegram file_id from its first upload
+_menu_file_ids: dict[str, str] = {}
+
+
+async def answer_menu(message: Message, text: str, reply_markup: InlineKeyboardMarkup) -> None:
+    """Answer with a random menu image captioned with text, or text alone without images.
+
+    Each image is uploaded once; later answers send its file_id instead.
+    """
+    img_path = get_random_menu_image()
+    if not img_path:
+        await message.answer(text, reply_markup=reply_markup, parse_mode="HTML")
+        return
+    sent = await message.answer_photo(
+        _menu_file_ids.get(img_path) or FSInputFile(img_path),
+        caption=text,
+        reply_markup=reply_markup,
+        parse_mode="HTML"
+    )
+    if sent.photo:
+        _menu_file_ids[img_path] = sent.photo[-1].file_id
+
+
+# IDs of manga known to exist, so a random pick needs one request instead of
+# probing the sparse ID space. Catalog listing pages are mixed in with the
+# store's IDs so the pick isn't limited to titles users have already seen;
+# reloaded when stale
+KNOWN_IDS_TTL = 3 * 3600  # seconds
+KNOWN_IDS_CATALOG_PAGES = 5  # per listing (new and popular)
+_known_manga_ids: list[int] = []
+_known_ids_expire_at = 0.0
+
+
+async def _get_known_manga_ids() -> list[int]:
+    global _known_manga_ids, _known_ids_expire_at
+    now = time.monotonic()
+    if now >= _known_ids_expire_at:
+        listings = [
+            client.search_manga(is_new=True, page=page)
+            for page in range(1, KNOWN_IDS_CATALOG_PAGES + 1)
+        ] + [
+            client.search_manga(popularity=True, page=page)
+            for page in range(1, KNOWN_IDS_CATALOG_PAGES + 1)
+        ]
+        results = await asyncio.gather(*listings, return_exceptions=True)
+        ids = set(await run_db(store.get_known_manga_ids))
+        for result in results:
+            if isinstance(result, BaseException):
+                continue
+            ids.update(item.id for item in result if item.id)
+        _known_manga_ids = list(ids)
+        _known_ids_expire_at = now + KNOWN_IDS_TTL
+    return _known_manga_ids
+
+
+# Deep link payload: manga_<id>
+_DEEP_LINK_RE = re.compile(r"manga_(\d+)")
 
 
 @router.message(CommandStart(deep_link=True))
 async def start_with_link(message: Message, command: CommandObject) -> None:
     """Handle /start with deep link (e.g., /start manga_12345)."""
-    store = get_favorites()
     user = message.from_user
-    store.add_user(
-        user_id=user.id,
-        username=user.username,
-        first_name=user.first_name,
-        last_name=user.last_name
-    )
+    track_user(user)
     
-    args = command.args
-    if args and args.startswith("manga_"):
+    match = _DEEP_LINK_RE.fullmatch(command.args or "")
+    if match:
         try:
-            manga_id = int(args.replace("manga_", ""))
-            client = get_client()
+            manga_id = int(match.group(1))
             
             await message.answer("⏳ Загружаю мангу...", reply_markup=MAIN_MENU)
             
-            detail = await run_sync(client.get_manga_detail, manga_id)
+            detail = await client.get_manga_detail(manga_id)
             if not detail:
                 await message.answer("Манга не найдена.", reply_markup=MAIN_MENU)
                 return
             
-            is_favorite = store.has(user.id, manga_id)
-            store.add_manga_to_history(user.id, manga_id, detail.title, detail.cover)
+            is_favorite = await is_in_favorites(store, user.id, manga_id)
+            track_manga_view(user.id, manga_id, detail.title, detail.cover)
             
             description = format_manga_detail(detail)
             reply_markup = build_manga_buttons(manga_id, is_favorite, config.BOT_USERNAME)
@@ -118,14 +180,8 @@ async def start_with_link(message: Message, command: CommandObject) -> None:
 @router.message(CommandStart())
 async def start(message: Message) -> None:
     """Handle /start command without arguments."""
-    store = get_favorites()
     user = message.from_user
-    store.add_user(
-        user_id=user.id,
-        username=user.username,
-        first_name=user.first_name,
-        last_name=user.last_name
-    )
+    track_user(user)
     await message.answer(WELCOME_GUIDE, reply_markup=MAIN_MENU, parse_mode="HTML")
 
 
@@ -157,19 +213,13 @@ def _build_profile_text(user, stats: dict, download_format: str) -> str:
 @router.message(F.text == "👤 Профиль")
 async def show_profile(message: Message) -> None:
     """Show user's profile with stats."""
-    store = get_favorites()
     user_id = message.from_user.id
     
     # Update last active
-    store.add_user(
-        user_id=user_id,
-        username=message.from_user.username,
-        first_name=message.from_user.first_name,
-        last_name=message.from_user.last_name
-    )
+    track_user(message.from_user)
     
-    stats = store.get_user_profile_stats(user_id)
-    download_format = store.get_download_format(user_id)
+    stats = await run_db(store.get_user_profile_stats, user_id)
+    download_format = await run_db(store.get_download_format, user_id)
     
     text = _build_profile_text(message.from_user, stats, download_format)
     await message.answer(text, reply_markup=build_profile_menu(), parse_mode="HTML")
@@ -178,23 +228,21 @@ async def show_profile(message: Message) -> None:
 @router.callback_query(F.data == "profile:main")
 async def profile_main(callback: CallbackQuery) -> None:
     """Return to main profile view."""
-    store = get_favorites()
     user_id = callback.from_user.id
     
-    stats = store.get_user_profile_stats(user_id)
-    download_format = store.get_download_format(user_id)
+    stats = await run_db(store.get_user_profile_stats, user_id)
+    download_format = await run_db(store.get_download_format, user_id)
     
     text = _build_profile_text(callback.from_user, stats, download_format)
     await callback.message.edit_text(text, reply_markup=build_profile_menu(), parse_mode="HTML")
-    await safe_callback_answer(callback)
+    ack_callback(callback)
 
 
 @router.callback_query(F.data == "profile:favorites")
 async def profile_favorites(callback: CallbackQuery) -> None:
     """Show user's favorites list."""
-    store = get_favorites()
     user_id = callback.from_user.id
-    favorites_raw = list(store.list(user_id))
+    favorites_raw = await run_db(store.list, user_id)
     
     if not favorites_raw:
         await callback.message.edit_text(
@@ -214,16 +262,15 @@ async def profile_favorites(callback: CallbackQuery) -> None:
         reply_markup=build_favorites_keyboard(favorites, page=1),
         parse_mode="HTML"
     )
-    await safe_callback_answer(callback)
+    ack_callback(callback)
 
 
 @router.callback_query(F.data.startswith("fav_page:"))
 async def favorites_page(callback: CallbackQuery) -> None:
     """Navigate favorites pages."""
-    page = int(callback.data.split(":")[1])
-    store = get_favorites()
+    page = int(callback.data.partition(":")[2])
     user_id = callback.from_user.id
-    favorites_raw = list(store.list(user_id))
+    favorites_raw = await run_db(store.list, user_id)
     favorites = [{"manga_id": m_id, "title": title, "cover": cover} for m_id, title, cover in favorites_raw]
     
     text = f"⭐ <b>Избранное</b> ({len(favorites)} манг)"
@@ -232,15 +279,14 @@ async def favorites_page(callback: CallbackQuery) -> None:
         reply_markup=build_favorites_keyboard(favorites, page=page),
         parse_mode="HTML"
     )
-    await safe_callback_answer(callback)
+    ack_callback(callback)
 
 
 @router.callback_query(F.data == "profile:history")
 async def profile_history(callback: CallbackQuery) -> None:
     """Show user's viewing history."""
-    store = get_favorites()
     user_id = callback.from_user.id
-    history = store.get_recent_manga(user_id, limit=50)
+    history = await run_db(store.get_recent_manga, user_id, limit=50)
     
     if not history:
         await callback.message.edit_text(
@@ -259,16 +305,15 @@ async def profile_history(callback: CallbackQuery) -> None:
         reply_markup=build_history_keyboard(history, page=1),
         parse_mode="HTML"
     )
-    await safe_callback_answer(callback)
+    ack_callback(callback)
 
 
 @router.callback_query(F.data.startswith("history_page:"))
 async def history_page(callback: CallbackQuery) -> None:
     """Navigate history pages."""
-    page = int(callback.data.split(":")[1])
-    store = get_favorites()
+    page = int(callback.data.partition(":")[2])
     user_id = callback.from_user.id
-    history = store.get_recent_manga(user_id, limit=50)
+    history = await run_db(store.get_recent_manga, user_id, limit=50)
     
     text = f"📖 <b>История просмотров</b> (последние {len(history)})"
     await callback.message.edit_text(
@@ -276,15 +321,14 @@ async def history_page(callback: CallbackQuery) -> None:
         reply_markup=build_history_keyboard(history, page=page),
         parse_mode="HTML"
     )
-    await safe_callback_answer(callback)
+    ack_callback(callback)
 
 
 @router.callback_query(F.data == "profile:settings")
 async def profile_settings(callback: CallbackQuery) -> None:
     """Show user settings."""
-    store = get_favorites()
     user_id = callback.from_user.id
-    current_format = store.get_download_format(user_id)
+    current_format = await run_db(store.get_download_format, user_id)
     
     text = (
         "⚙️ <b>Настройки</b>\n\n"
@@ -296,17 +340,16 @@ async def profile_settings(callback: CallbackQuery) -> None:
         reply_markup=build_settings_keyboard(current_format),
         parse_mode="HTML"
     )
-    await safe_callback_answer(callback)
+    ack_callback(callback)
 
 
 @router.callback_query(F.data.startswith("set_format:"))
 async def set_format(callback: CallbackQuery) -> None:
     """Set download format preference."""
-    new_format = callback.data.split(":")[1]
-    store = get_favorites()
+    new_format = callback.data.partition(":")[2]
     user_id = callback.from_user.id
     
-    store.set_download_format(user_id, new_format)
+    await run_db(store.set_download_format, user_id, new_format)
     
     text = (
         "⚙️ <b>Настройки</b>\n\n"
@@ -324,60 +367,34 @@ async def set_format(callback: CallbackQuery) -> None:
 @router.message(F.text == "📚 Каталог")
 async def show_catalog(message: Message) -> None:
     """Show catalog menu with random image."""
-    img_path = get_random_menu_image()
-    if img_path:
-        await message.answer_photo(
-            FSInputFile(img_path),
-            caption="📚 <b>Каталог</b>\n\nВыбери раздел:",
-            reply_markup=build_catalog_menu(),
-            parse_mode="HTML"
-        )
-    else:
-        await message.answer("📚 <b>Каталог</b>\n\nВыбери раздел:", reply_markup=build_catalog_menu(), parse_mode="HTML")
+    await answer_menu(message, "📚 <b>Каталог</b>\n\nВыбери раздел:", build_catalog_menu())
 
 
 @router.message(F.text == "🔍 Поиск")
 async def show_search(message: Message) -> None:
     """Show search menu with random image."""
-    img_path = get_random_menu_image()
-    if img_path:
-        await message.answer_photo(
-            FSInputFile(img_path),
-            caption="🔍 <b>Поиск</b>\n\nКак будем искать?",
-            reply_markup=build_search_menu(),
-            parse_mode="HTML"
-        )
-    else:
-        await message.answer("🔍 <b>Поиск</b>\n\nКак будем искать?", reply_markup=build_search_menu(), parse_mode="HTML")
+    await answer_menu(message, "🔍 <b>Поиск</b>\n\nКак будем искать?", build_search_menu())
 
 
 @router.message(F.text == "🎲 Случайная")
 async def show_random_manga(message: Message) -> None:
     """Show a random manga."""
-    import random
-    
-    store = get_favorites()
-    client = get_client()
     user = message.from_user
     
-    store.add_user(
-        user_id=user.id,
-        username=user.username,
-        first_name=user.first_name,
-        last_name=user.last_name
-    )
+    track_user(user)
     
     await message.answer("🎲 Ищу случайную мангу...")
     
-    # Try random manga IDs (1-6965)
-    for _ in range(5):  # Try up to 5 times
+    known_ids = await _get_known_manga_ids()
+    # Pick a manga known to exist; random IDs (1-6965) only if none are known
+    for attempt in range(5):  # Try up to 5 times
         try:
-            manga_id = random.randint(1, 6965)
-            detail = await run_sync(client.get_manga_detail, manga_id)
+            manga_id = random.choice(known_ids) if known_ids else random.randint(1, 6965)
+            detail = await client.get_manga_detail(manga_id)
             
             if detail and detail.title:
-                is_favorite = store.has(user.id, manga_id)
-                store.add_manga_to_history(user.id, manga_id, detail.title, detail.cover)
+                is_favorite = await is_in_favorites(store, user.id, manga_id)
+                track_manga_view(user.id, manga_id, detail.title, detail.cover)
                 
                 description = format_manga_detail(detail)
                 reply_markup = build_manga_buttons(manga_id, is_favorite, config.BOT_USERNAME)
@@ -388,7 +405,7 @@ async def show_random_manga(message: Message) -> None:
                     await message.answer(description, reply_markup=reply_markup)
                 return
         except Exception as e:
-            store.log_error("random_manga", str(e), f"manga_id={manga_id}")
+            await run_db(store.log_error, "random_manga", str(e), f"manga_id={manga_id}")
             continue
     
     await message.answer("😔 Не удалось найти случайную мангу. Попробуй ещё раз!")
@@ -1,30 +1,64 @@
 """Manga handlers: details, chapters, favorites, downloads."""
 from __future__ import annotations
 
+import asyncio
+import functools
+import io
 import os
 import time
 import logging
+import weakref
 
 from aiogram import F, Router
 from aiogram.fsm.context import FSMContext
-from aiogram.types import CallbackQuery, FSInputFile, InlineKeyboardButton, InlineKeyboardMarkup, Message
+from aiogram.types import (
+    BufferedInputFile,
+    CallbackQuery,
+    FSInputFile,
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    InputMediaPhoto,
+    Message,
+)
 
 import config
-from keyboards import build_chapter_keyboard, build_format_keyboard, build_manga_buttons
-from states import ChapterStates
-from dependencies import get_client, get_favorites
+from keyboards import (
+    build_chapter_keyboard,
+    build_format_keyboard,
+    build_manga_buttons,
+    build_volume_format_keyboard,
+    build_volume_list_keyboard,
+)
+from states import SEARCH_STATE, ChapterStates
+from desu_client import DesuClient
+from favorites import FavoritesStore
+from tasks import request_chapter_check, track_manga_view
 from utils import (
+    run_db,
     run_sync,
+    is_in_favorites,
     chapter_title,
     format_manga_detail,
     download_chapter_as_pdf,
     download_chapter_as_cbz,
+    download_image,
+    download_volume_as_cbz,
+    download_volume_as_pdf,
+    resize_image_for_telegram,
+    ack_callback,
+    create_background_task,
+    page_url,
     safe_callback_answer,
+    SEND_LIMITER,
 )
 
 router = Router()
 logger = logging.getLogger(__name__)
 
+# Bound by handlers.setup_routers() once dependencies are initialized
+client: DesuClient
+store: FavoritesStore
+
 
 def create_progress_callback(message):
     """Create a progress callback that edits the message with progress.
@@ -49,15 +83,107 @@ def create_progress_callback(message):
     return progress_callback
 
 
-@router.callback_query(F.data.startswith("manga:"))
-async def show_manga(callback: CallbackQuery) -> None:
+async def _mark_read(user_id: int, manga_id: int, chapters: list[tuple[int, str]]) -> None:
+    try:
+        await run_db(store.mark_chapters_read, user_id, manga_id, chapters)
+    except Exception as e:
+        logger.error(f"Failed to mark chapters read for user {user_id}: {e}")
+
+
+def mark_read_in_background(user_id: int, manga_id: int, chapters: list[tuple[int, str]]) -> None:
+    """Record chapters as read without holding up the reply.
+    
+    The database thread runs writes in order, so later reads of the history
+    still see them.
+    """
+    create_background_task(_mark_read(user_id, manga_id, chapters))
+
+
+# chat_id -> lock held while a download runs in that chat; an entry
+# disappears once no handler holds or waits on its lock
+_chat_locks: weakref.WeakValueDictionary[int, asyncio.Lock] = weakref.WeakValueDictionary()
+
+
+def serialized_per_chat(handler):
+    """Run a callback handler for one chat at a time, in arrival order.
+    
+    Keeps progress edits and uploads of back-to-back downloads from
+    interleaving; other chats are not affected.
+    """
+    @functools.wraps(handler)
+    async def wrapper(callback: CallbackQuery, *args):
+        if not callback.message:
+            return await handler(callback, *args)
+        chat_id = callback.message.chat.id
+        lock = _chat_locks.get(chat_id)
+        if lock is None:
+            lock = _chat_locks[chat_id] = asyncio.Lock()
+        if lock.locked():
+            # Stop the button spinner while this one waits its turn
+            ack_callback(callback)
+        async with lock:
+            return await handler(callback, *args)
+    return wrapper
+
+
+# (handler name, *args) -> build of that file in progress
+_inflight_builds: dict[tuple, asyncio.Future] = {}
+
+
+def single_build(handler):
+    """Let one call per (manga, chapter/volume) build and upload a file at a time.
+    
+    A click on a file that is already being built waits for that build,
+    then runs the handler, which finds the uploaded file_id in the cache.
+    If the build failed, it builds the file itself.
+    """
+    @functools.wraps(handler)
+    async def wrapper(callback: CallbackQuery, *args):
+        key = (handler.__name__, *args)
+        while (pending := _inflight_builds.get(key)) is not None:
+            ack_callback(callback)
+            if callback.message:
+                try:
+                    await callback.message.edit_text("⏳ Этот файл уже готовится, подождите...")
+                except Exception:
+                    pass
+            # Shielded so a cancelled waiter doesn't cancel the shared future
+            await asyncio.shield(pending)
+        future = _inflight_builds[key] = asyncio.get_running_loop().create_future()
+        try:
+            return await handler(callback, *args)
+        finally:
+            del _inflight_builds[key]
+            future.set_result(None)
+    return wrapper
+
+
+async def _delete_quietly(message: Message) -> None:
+    try:
+        await message.delete()
+    except Exception:
+        pass
+
+
+async def replace_with_document(message: Message, document, caption: str) -> Message:
+    """Delete message and send document in its place.
+    
+    Both requests are issued concurrently, so the user waits one round trip
+    instead of two. Delete failures are ignored; send failures propagate.
+    """
+    await SEND_LIMITER.acquire()
+    _, sent = await asyncio.gather(
+        _delete_quietly(message),
+        message.answer_document(document, caption=caption),
+    )
+    return sent
+
+
+async def show_manga(callback: CallbackQuery, manga_id: int) -> None:
     """Show manga details."""
-    await safe_callback_answer(callback)
+    ack_callback(callback)
     if not callback.message:
         return
-    manga_id = int(callback.data.split(":")[1])
-    client = get_client()
-    store = get_favorites()
     user_id = callback.from_user.id
     
     try:
@@ -65,11 +191,11 @@ async def show_manga(callback: CallbackQuery) -> None:
     except Exception:
         pass
 
-    detail = await run_sync(client.get_manga_detail, manga_id)
-    is_favorite = store.has(user_id, manga_id)
+    detail = await client.get_manga_detail(manga_id)
+    is_favorite = await is_in_favorites(store, user_id, manga_id)
     
     # Add to viewing history
-    store.add_manga_to_history(user_id, manga_id, detail.title, detail.cover)
+    track_manga_view(user_id, manga_id, detail.title, detail.cover)
 
     description = format_manga_detail(detail)
     reply_markup = build_manga_buttons(manga_id, is_favorite, config.BOT_USERNAME)
@@ -87,25 +213,21 @@ async def show_manga(callback: CallbackQuery) -> None:
             await callback.message.answer(description, reply_markup=reply_markup)
 
 
-@router.callback_query(F.data.startswith("fav:"))
-async def handle_favorite(callback: CallbackQuery) -> None:
+async def handle_favorite(callback: CallbackQuery, action: str, manga_id: int) -> None:
     """Add/remove manga from favorites."""
     if not callback.message:
         await safe_callback_answer(callback)
         return
-    action, manga_id_text = callback.data.split(":")[1:]
-    manga_id = int(manga_id_text)
-    store = get_favorites()
-    client = get_client()
     user_id = callback.from_user.id
 
     if action == "add":
-        detail = await run_sync(client.get_manga_detail, manga_id)
-        store.add(user_id, manga_id, detail.title, detail.cover)
+        detail = await client.get_manga_detail(manga_id)
+        await run_db(store.add, user_id, manga_id, detail.title, detail.cover)
+        request_chapter_check()
         is_favorite = True
         await callback.answer("✅ Добавлено в избранное!")
     else:
-        store.remove(user_id, manga_id)
+        await run_db(store.remove, user_id, manga_id)
         is_favorite = False
         await callback.answer("❌ Удалено из избранного!")
     
@@ -116,29 +238,22 @@ async def handle_favorite(callback: CallbackQuery) -> None:
         pass
 
 
-@router.callback_query(F.data.startswith("chapters:"))
-async def show_chapters(callback: CallbackQuery) -> None:
+async def show_chapters(callback: CallbackQuery, manga_id: int, page: int) -> None:
     """Show chapter list with read chapters marked."""
-    await safe_callback_answer(callback)
+    ack_callback(callback)
     if not callback.message:
         return
-    _, manga_id_text, page_text = callback.data.split(":")
-    manga_id = int(manga_id_text)
-    page = int(page_text)
 
-    client = get_client()
-    store = get_favorites()
-    
-    chapters = await run_sync(client.get_manga_chapters, manga_id)
-    if not chapters:
+    index = await client.get_chapter_index(manga_id)
+    if not index.chapters:
         await callback.message.edit_text("Нет доступных глав.")
         return
 
     # Get read chapters for this user
-    read_chapters = store.get_read_chapters(callback.from_user.id, manga_id)
+    read_chapters = await run_db(store.get_read_chapters, callback.from_user.id, manga_id)
     read_chapter_ids = set(read_chapters)
 
-    keyboard = build_chapter_keyboard(chapters, manga_id, page, read_chapter_ids=read_chapter_ids)
+    keyboard = build_chapter_keyboard(index, manga_id, page, read_chapter_ids=read_chapter_ids)
     try:
         await callback.message.edit_text("Выберите главу (✅ = прочитано):", reply_markup=keyboard)
     except Exception:
@@ -148,27 +263,17 @@ async def show_chapters(callback: CallbackQuery) -> None:
 @router.callback_query(F.data.startswith("goto_ch:"))
 async def prompt_chapter_number(callback: CallbackQuery, state: FSMContext) -> None:
     """Prompt user to enter chapter number."""
-    await safe_callback_answer(callback)
+    ack_callback(callback)
     if not callback.message:
         return
-    manga_id = int(callback.data.split(":")[1])
+    manga_id = int(callback.data.partition(":")[2])
     
+    SEARCH_STATE.pop(callback.from_user.id, None)
     await state.set_state(ChapterStates.waiting_chapter_number)
     await state.update_data(manga_id=manga_id)
     
-    client = get_client()
-    chapters = await run_sync(client.get_manga_chapters, manga_id)
-    
-    ch_numbers = []
-    for ch in chapters:
-        num = ch.get("ch") or ch.get("chapter") or ch.get("number")
-        if num:
-            try:
-                ch_numbers.append(float(num))
-            except (ValueError, TypeError):
-                pass
-    
-    hint = f"Available chapters: {min(ch_numbers)} - {max(ch_numbers)}" if ch_numbers else ""
+    index = await client.get_chapter_index(manga_id)
+    hint = f"Available chapters: {index.lo} - {index.hi}" if index.lo is not None else ""
     
     try:
         await callback.message.edit_text(
@@ -194,22 +299,8 @@ async def handle_chapter_number_input(message: Message, state: FSMContext) -> No
     
     chapter_input = message.text.strip()
     
-    client = get_client()
-    chapters = await run_sync(client.get_manga_chapters, manga_id)
-    
-    found_chapter = None
-    for ch in chapters:
-        ch_num = ch.get("ch") or ch.get("chapter") or ch.get("number")
-        if ch_num and str(ch_num) == chapter_input:
-            found_chapter = ch
-            break
-    
-    if not found_chapter:
-        for ch in chapters:
-            ch_num = ch.get("ch") or ch.get("chapter") or ch.get("number")
-            if ch_num and str(ch_num).startswith(chapter_input):
-                found_chapter = ch
-                break
+    index = await client.get_chapter_index(manga_id)
+    found_chapter = index.find_by_number(chapter_input)
     
     if not found_chapter:
         await message.answer(
@@ -229,23 +320,17 @@ async def handle_chapter_number_input(message: Message, state: FSMContext) -> No
     )
 
 
-@router.callback_query(F.data.startswith("chapter:"))
-async def show_chapter_options(callback: CallbackQuery) -> None:
+async def show_chapter_options(callback: CallbackQuery, manga_id: int, chapter_id: int) -> None:
     """Show format choice for chapter download or use default format."""
-    await safe_callback_answer(callback)
+    ack_callback(callback)
     if not callback.message:
         return
-    _, manga_id_text, chapter_id_text = callback.data.split(":")
-    manga_id = int(manga_id_text)
-    chapter_id = int(chapter_id_text)
     
-    store = get_favorites()
     user_id = callback.from_user.id
-    user_format = store.get_download_format(user_id)
+    user_format = await run_db(store.get_download_format, user_id)
 
-    client = get_client()
-    chapters = await run_sync(client.get_manga_chapters, manga_id)
-    chapter_info = next((ch for ch in chapters if ch.get("id") == chapter_id), {})
+    index = await client.get_chapter_index(manga_id)
+    chapter_info = index.by_id.get(chapter_id, {})
     ch_name = chapter_title(chapter_info) or f"Chapter_{chapter_id}"
     
     try:
@@ -260,36 +345,28 @@ async def show_chapter_options(callback: CallbackQuery) -> None:
         )
 
 
-@router.callback_query(F.data.startswith("dl_pdf:"))
-async def download_pdf(callback: CallbackQuery) -> None:
+@serialized_per_chat
+@single_build
+async def download_pdf(callback: CallbackQuery, manga_id: int, chapter_id: int) -> None:
     """Download chapter as PDF."""
-    await safe_callback_answer(callback)
+    ack_callback(callback)
     if not callback.message:
         return
-    _, manga_id_text, chapter_id_text = callback.data.split(":")
-    manga_id = int(manga_id_text)
-    chapter_id = int(chapter_id_text)
 
-    store = get_favorites()
-    client = get_client()
-    
-    chapters = await run_sync(client.get_manga_chapters, manga_id)
-    chapter_info = next((ch for ch in chapters if ch.get("id") == chapter_id), {})
+    detail = await client.get_manga_detail(manga_id)
+    index = await client.get_chapter_index(manga_id)
+    chapter_info = index.by_id.get(chapter_id, {})
     ch_name = chapter_title(chapter_info) or f"Chapter_{chapter_id}"
-    
-    detail = await run_sync(client.get_manga_detail, manga_id)
     manga_title = detail.title if detail else "Manga"
-    file_name = f"{manga_title} - {ch_name}.pdf"
+    base_name = f"{manga_title} - {ch_name}"
+    file_name = f"{base_name}.pdf"
+    caption = f"📕 {base_name}"
     
     # Check cache
     cached_file_id = store.get_cached_file(manga_id, chapter_id, "pdf")
     if cached_file_id:
-        try:
-            await callback.message.delete()
-        except Exception:
-            pass
-        await callback.message.answer_document(cached_file_id, caption=f"📕 {manga_title} - {ch_name}")
-        store.mark_chapter_read(callback.from_user.id, manga_id, chapter_id, ch_name)
+        await replace_with_document(callback.message, cached_file_id, caption)
+        mark_read_in_background(callback.from_user.id, manga_id, [(chapter_id, ch_name)])
         return
     
     try:
@@ -297,7 +374,7 @@ async def download_pdf(callback: CallbackQuery) -> None:
     except Exception:
         pass
     
-    pages = await run_sync(client.get_chapter_pages, manga_id, chapter_id)
+    pages = await client.get_chapter_pages(manga_id, chapter_id)
     if not pages:
         try:
             await callback.message.edit_text("No pages found for this chapter.")
@@ -307,17 +384,18 @@ async def download_pdf(callback: CallbackQuery) -> None:
     
     # Create progress callback
     progress_cb = create_progress_callback(callback.message)
-    pdf_path = await download_chapter_as_pdf(pages, f"{manga_title} - {ch_name}", progress_callback=progress_cb)
+    pdf_result = await download_chapter_as_pdf(pages, base_name, progress_callback=progress_cb)
     
-    if not pdf_path or not os.path.exists(pdf_path):
+    if not pdf_result:
         try:
             await callback.message.edit_text("❌ Failed to create PDF.")
         except Exception:
             pass
         return
     
-    # Check file size
-    file_size_mb = os.path.getsize(pdf_path) / (1024 * 1024)
+    # Check file size; small files come back as bytes, large ones as a temp file path
+    pdf_path = pdf_result if isinstance(pdf_result, str) else None
+    file_size_mb = (os.path.getsize(pdf_path) if pdf_path else len(pdf_result)) / (1024 * 1024)
     use_telethon = False
     
     if file_size_mb > 50:
@@ -332,7 +410,8 @@ async def download_pdf(callback: CallbackQuery) -> None:
             except Exception:
                 pass
         else:
-            os.remove(pdf_path)
+            if pdf_path:
+                os.remove(pdf_path)
             try:
                 await callback.message.edit_text(
                     f"❌ Глава слишком большая ({file_size_mb:.1f} MB).\n"
@@ -356,7 +435,7 @@ async def download_pdf(callback: CallbackQuery) -> None:
             sent, file_id = await send_large_file(
                 chat_id=callback.from_user.id,
                 file_path=pdf_path,
-                caption=f"📕 {manga_title} - {ch_name}",
+                caption=caption,
                 message_callback=upload_progress_cb
             )
             
@@ -371,54 +450,42 @@ async def download_pdf(callback: CallbackQuery) -> None:
                 return
             
             if file_id:
-                store.cache_file(manga_id, chapter_id, "pdf", file_id, file_name)
+                await run_db(store.cache_file, manga_id, chapter_id, "pdf", file_id, file_name)
         else:
-            pdf_file = FSInputFile(pdf_path, filename=file_name)
-            try:
-                await callback.message.delete()
-            except Exception:
-                pass
-            sent_msg = await callback.message.answer_document(pdf_file, caption=f"📕 {manga_title} - {ch_name}")
+            pdf_file = FSInputFile(pdf_path, filename=file_name) if pdf_path else BufferedInputFile(pdf_result, filename=file_name)
+            sent_msg = await replace_with_document(callback.message, pdf_file, caption)
             
             if sent_msg.document:
-                store.cache_file(manga_id, chapter_id, "pdf", sent_msg.document.file_id, file_name)
+                await run_db(store.cache_file, manga_id, chapter_id, "pdf", sent_msg.document.file_id, file_name)
         
-        store.mark_chapter_read(callback.from_user.id, manga_id, chapter_id, ch_name)
+        mark_read_in_background(callback.from_user.id, manga_id, [(chapter_id, ch_name)])
     finally:
-        if os.path.exists(pdf_path):
+        if pdf_path and os.path.exists(pdf_path):
             os.remove(pdf_path)
 
 
-@router.callback_query(F.data.startswith("dl_zip:"))
-async def download_zip(callback: CallbackQuery) -> None:
+@serialized_per_chat
+@single_build
+async def download_zip(callback: CallbackQuery, manga_id: int, chapter_id: int) -> None:
     """Download chapter as CBZ (Comic Book ZIP)."""
-    await safe_callback_answer(callback)
+    ack_callback(callback)
     if not callback.message:
         return
-    _, manga_id_text, chapter_id_text = callback.data.split(":")
-    manga_id = int(manga_id_text)
-    chapter_id = int(chapter_id_text)
 
-    store = get_favorites()
-    client = get_client()
-    
-    chapters = await run_sync(client.get_manga_chapters, manga_id)
-    chapter_info = next((ch for ch in chapters if ch.get("id") == chapter_id), {})
+    detail = await client.get_manga_detail(manga_id)
+    index = await client.get_chapter_index(manga_id)
+    chapter_info = index.by_id.get(chapter_id, {})
     ch_name = chapter_title(chapter_info) or f"Chapter_{chapter_id}"
-    
-    detail = await run_sync(client.get_manga_detail, manga_id)
     manga_title = detail.title if detail else "Manga"
-    file_name = f"{manga_title} - {ch_name}.cbz"
+    base_name = f"{manga_title} - {ch_name}"
+    file_name = f"{base_name}.cbz"
+    caption = f"📦 {base_name}"
     
     # Check cache
     cached_file_id = store.get_cached_file(manga_id, chapter_id, "cbz")
     if cached_file_id:
-        try:
-            await callback.message.delete()
-        except Exception:
-            pass
-        await callback.message.answer_document(cached_file_id, caption=f"📦 {manga_title} - {ch_name}")
-        store.mark_chapter_read(callback.from_user.id, manga_id, chapter_id, ch_name)
+        await replace_with_document(callback.message, cached_file_id, caption)
+        mark_read_in_background(callback.from_user.id, manga_id, [(chapter_id, ch_name)])
         return
     
     try:
@@ -426,7 +493,7 @@ async def download_zip(callback: CallbackQuery) -> None:
     except Exception:
         pass
     
-    pages = await run_sync(client.get_chapter_pages, manga_id, chapter_id)
+    pages = await client.get_chapter_pages(manga_id, chapter_id)
     if not pages:
         try:
             await callback.message.edit_text("Страницы не найдены.")
@@ -436,17 +503,18 @@ async def download_zip(callback: CallbackQuery) -> None:
     
     # Create progress callback
     progress_cb = create_progress_callback(callback.message)
-    cbz_path = await download_chapter_as_cbz(pages, f"{manga_title} - {ch_name}", progress_callback=progress_cb)
+    cbz_result = await download_chapter_as_cbz(pages, base_name, progress_callback=progress_cb)
     
-    if not cbz_path or not os.path.exists(cbz_path):
+    if not cbz_result:
         try:
             await callback.message.edit_text("❌ Не удалось создать CBZ.")
         except Exception:
             pass
         return
     
-    # Check file size
-    file_size_mb = os.path.getsize(cbz_path) / (1024 * 1024)
+    # Check file size; small files come back as bytes, large ones as a temp file path
+    cbz_path = cbz_result if isinstance(cbz_result, str) else None
+    file_size_mb = (os.path.getsize(cbz_path) if cbz_path else len(cbz_result)) / (1024 * 1024)
     use_telethon = False
     
     if file_size_mb > 50:
@@ -461,7 +529,8 @@ async def download_zip(callback: CallbackQuery) -> None:
             except Exception:
                 pass
         else:
-            os.remove(cbz_path)
+            if cbz_path:
+                os.remove(cbz_path)
             try:
                 await callback.message.edit_text(
                     f"❌ Глава слишком большая ({file_size_mb:.1f} MB).\n"
@@ -485,7 +554,7 @@ async def download_zip(callback: CallbackQuery) -> None:
             sent, file_id = await send_large_file(
                 chat_id=callback.from_user.id,
                 file_path=cbz_path,
-                caption=f"📦 {manga_title} - {ch_name}",
+                caption=caption,
                 message_callback=upload_progress_cb
             )
             
@@ -500,48 +569,36 @@ async def download_zip(callback: CallbackQuery) -> None:
                 return
             
             if file_id:
-                store.cache_file(manga_id, chapter_id, "cbz", file_id, file_name)
+                await run_db(store.cache_file, manga_id, chapter_id, "cbz", file_id, file_name)
         else:
-            cbz_file = FSInputFile(cbz_path, filename=file_name)
-            try:
-                await callback.message.delete()
-            except Exception:
-                pass
-            sent_msg = await callback.message.answer_document(cbz_file, caption=f"📦 {manga_title} - {ch_name}")
+            cbz_file = FSInputFile(cbz_path, filename=file_name) if cbz_path else BufferedInputFile(cbz_result, filename=file_name)
+            sent_msg = await replace_with_document(callback.message, cbz_file, caption)
             
             if sent_msg.document:
-                store.cache_file(manga_id, chapter_id, "cbz", sent_msg.document.file_id, file_name)
+                await run_db(store.cache_file, manga_id, chapter_id, "cbz", sent_msg.document.file_id, file_name)
         
-        store.mark_chapter_read(callback.from_user.id, manga_id, chapter_id, ch_name)
+        mark_read_in_background(callback.from_user.id, manga_id, [(chapter_id, ch_name)])
     finally:
-        if os.path.exists(cbz_path):
+        if cbz_path and os.path.exists(cbz_path):
             os.remove(cbz_path)
 
 
-@router.callback_query(F.data.startswith("read_album:"))
-async def read_album(callback: CallbackQuery) -> None:
+@serialized_per_chat
+async def read_album(callback: CallbackQuery, manga_id: int, chapter_id: int) -> None:
     """Read chapter as album (media group) - sends images directly to chat."""
-    from aiogram.types import InputMediaPhoto
     
-    await safe_callback_answer(callback)
+    ack_callback(callback)
     if not callback.message:
         return
-    _, manga_id_text, chapter_id_text = callback.data.split(":")
-    manga_id = int(manga_id_text)
-    chapter_id = int(chapter_id_text)
 
-    store = get_favorites()
-    client = get_client()
-    
-    chapters = await run_sync(client.get_manga_chapters, manga_id)
-    chapter_info = next((ch for ch in chapters if ch.get("id") == chapter_id), {})
+    detail = await client.get_manga_detail(manga_id)
+    index = await client.get_chapter_index(manga_id)
+    chapter_info = index.by_id.get(chapter_id, {})
     ch_name = chapter_title(chapter_info) or f"Chapter_{chapter_id}"
-    
-    detail = await run_sync(client.get_manga_detail, manga_id)
     manga_title = detail.title if detail else "Manga"
     
     # Check cache first
-    cached_album = store.get_cached_album(manga_id, chapter_id)
+    cached_album = await run_db(store.get_cached_album, manga_id, chapter_id)
     if cached_album:
         try:
             await callback.message.edit_text(f"📖 <b>{manga_title}</b>\n📚 {ch_name}\n\n⚡ Отправляю из кэша...", parse_mode="HTML")
@@ -557,12 +614,14 @@ async def read_album(callback: CallbackQuery) -> None:
         for batch_file_ids in cached_album:
             media_group = [InputMediaPhoto(media=file_id) for file_id in batch_file_ids]
             try:
+                # Each photo in a group counts as a message
+                await SEND_LIMITER.acquire(len(media_group))
                 await callback.message.answer_media_group(media_group)
             except Exception as e:
-                store.log_error("album_cache_send", str(e), f"manga_id={manga_id}, chapter_id={chapter_id}")
+                await run_db(store.log_error, "album_cache_send", str(e), f"manga_id={manga_id}, chapter_id={chapter_id}")
         
         # Mark as read
-        store.mark_chapter_read(callback.from_user.id, manga_id, chapter_id, ch_name)
+        mark_read_in_background(callback.from_user.id, manga_id, [(chapter_id, ch_name)])
         
         nav_keyboard = InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(text="📖 К списку глав", callback_data=f"chapters:{manga_id}:1")]
@@ -576,9 +635,9 @@ async def read_album(callback: CallbackQuery) -> None:
         pass
     
     try:
-        pages = await run_sync(client.get_chapter_pages, manga_id, chapter_id)
+        pages = await client.get_chapter_pages(manga_id, chapter_id)
     except Exception as e:
-        store.log_error("album_read", str(e), f"manga_id={manga_id}, chapter_id={chapter_id}")
+        await run_db(store.log_error, "album_read", str(e), f"manga_id={manga_id}, chapter_id={chapter_id}")
         await callback.message.edit_text("❌ Не удалось загрузить страницы.")
         return
     
@@ -587,11 +646,7 @@ async def read_album(callback: CallbackQuery) -> None:
         return
     
     # Extract URLs from page dicts
-    page_urls = []
-    for page in pages:
-        url = page.get("img") or page.get("image") or page.get("url")
-        if url:
-            page_urls.append(url)
+    page_urls = [url for page in pages if (url := page_url(page))]
     
     if not page_urls:
         await callback.message.edit_text("❌ Не удалось получить ссылки на страницы.")
@@ -606,53 +661,60 @@ async def read_album(callback: CallbackQuery) -> None:
     await callback.message.answer(f"📖 <b>{manga_title}</b>\n📚 {ch_name}\n\n📄 Страниц: {len(page_urls)}\n⏳ Загрузка...", parse_mode="HTML")
     
     # Download and send images (Telegram can't fetch from desu.uno directly due to headers)
-    from utils import download_image
-    from aiogram.types import BufferedInputFile
-    import io
-    
     all_batches_success = True  # Track if all batches sent successfully
     
+    def encode_page(img) -> bytes:
+        """Encode a page as a Telegram-sized JPEG."""
+        # Resize if too large for Telegram (max 4096px)
+        img = resize_image_for_telegram(img)
+        img_buffer = io.BytesIO()
+        img.save(img_buffer, format="JPEG", quality=85)
+        return img_buffer.getvalue()
+    
+    async def prepare_page(url: str) -> bytes | None:
+        """Download a page and encode it for sending."""
+        img = await download_image(url)
+        if not img:
+            return None
+        return await run_sync(encode_page, img)
+    
     for batch_index, i in enumerate(range(0, len(page_urls), 10)):
         batch_urls = page_urls[i:i + 10]
         media_group = []
         download_failed = False
         
-        for url in batch_urls:
-            try:
-                img = await run_sync(download_image, url)
-                if img:
-                    # Resize if too large for Telegram (max 4096px)
-                    from utils import resize_image_for_telegram
-                    img = resize_image_for_telegram(img)
-                    
-                    img_buffer = io.BytesIO()
-                    img.save(img_buffer, format="JPEG", quality=85)
-                    img_buffer.seek(0)
-                    media_group.append(InputMediaPhoto(
-                        media=BufferedInputFile(img_buffer.read(), filename="page.jpg")
-                    ))
-                else:
-                    download_failed = True
-            except Exception as e:
-                store.log_error("album_download", str(e), f"url={url[:50]}")
+        # Fetch the whole batch at once; gather keeps page order
+        results = await asyncio.gather(
+            *(prepare_page(url) for url in batch_urls),
+            return_exceptions=True,
+        )
+        for url, result in zip(batch_urls, results):
+            if isinstance(result, Exception):
+                await run_db(store.log_error, "album_download", str(result), f"url={url[:50]}")
+                download_failed = True
+            elif result:
+                media_group.append(InputMediaPhoto(
+                    media=BufferedInputFile(result, filename="page.jpg")
+                ))
+            else:
                 download_failed = True
-                continue
         
         # Only send and cache if we have images AND all downloaded successfully
         if media_group:
             try:
+                await SEND_LIMITER.acquire(len(media_group))
                 sent_messages = await callback.message.answer_media_group(media_group)
                 # Only cache if ALL images in batch downloaded and sent successfully
                 if not download_failed and len(sent_messages) == len(batch_urls):
                     file_ids = [msg.photo[-1].file_id for msg in sent_messages if msg.photo]
                     if len(file_ids) == len(batch_urls):
-                        store.cache_album_batch(manga_id, chapter_id, batch_index, file_ids)
+                        await run_db(store.cache_album_batch, manga_id, chapter_id, batch_index, file_ids)
                     else:
                         all_batches_success = False
                 else:
                     all_batches_success = False
             except Exception as e:
-                store.log_error("album_send", str(e), f"batch={i}-{i+len(batch_urls)}")
+                await run_db(store.log_error, "album_send", str(e), f"batch={i}-{i+len(batch_urls)}")
                 await callback.message.answer(f"⚠️ Ошибка при отправке страниц {i+1}-{i+len(batch_urls)}")
                 all_batches_success = False
         else:
@@ -662,10 +724,10 @@ async def read_album(callback: CallbackQuery) -> None:
     
     # If any batch failed, clear partial cache to force re-download next time
     if not all_batches_success:
-        store.clear_album_cache_for_chapter(manga_id, chapter_id)
+        await run_db(store.clear_album_cache_for_chapter, manga_id, chapter_id)
     
     # Mark as read
-    store.mark_chapter_read(callback.from_user.id, manga_id, chapter_id, ch_name)
+    mark_read_in_background(callback.from_user.id, manga_id, [(chapter_id, ch_name)])
     
     # Navigation buttons
     nav_keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -676,18 +738,13 @@ async def read_album(callback: CallbackQuery) -> None:
 
 # ============== Volume Download Handlers ==============
 
-@router.callback_query(F.data.startswith("volumes:"))
-async def show_volumes(callback: CallbackQuery) -> None:
+async def show_volumes(callback: CallbackQuery, manga_id: int) -> None:
     """Show list of volumes available for download."""
-    from keyboards import build_volume_list_keyboard
-    
-    await safe_callback_answer(callback)
+    ack_callback(callback)
     if not callback.message:
         return
-    manga_id = int(callback.data.split(":")[1])
     
-    client = get_client()
-    chapters = await run_sync(client.get_manga_chapters, manga_id)
+    chapters = await client.get_manga_chapters(manga_id)
     
     if not chapters:
         try:
@@ -728,19 +785,13 @@ async def show_volumes(callback: CallbackQuery) -> None:
         await callback.message.answer("📚 Выберите том для скачивания:", reply_markup=keyboard)
 
 
-@router.callback_query(F.data.startswith("vol_format:"))
-async def show_volume_format(callback: CallbackQuery) -> None:
+async def show_volume_format(callback: CallbackQuery, manga_id: int, volume: str) -> None:
     """Show format selection for volume download."""
-    from keyboards import build_volume_format_keyboard
-    
-    await safe_callback_answer(callback)
+    ack_callback(callback)
     if not callback.message:
         return
-    _, manga_id_text, volume = callback.data.split(":")
-    manga_id = int(manga_id_text)
     
-    client = get_client()
-    chapters = await run_sync(client.get_manga_chapters, manga_id)
+    chapters = await client.get_manga_chapters(manga_id)
     
     # Count chapters in this volume
     vol_chapters = [ch for ch in chapters if str(ch.get("vol")) == volume]
@@ -761,24 +812,17 @@ async def show_volume_format(callback: CallbackQuery) -> None:
         )
 
 
-@router.callback_query(F.data.startswith("dl_vol_pdf:"))
-async def download_volume_pdf(callback: CallbackQuery) -> None:
+@serialized_per_chat
+@single_build
+async def download_volume_pdf(callback: CallbackQuery, manga_id: int, volume: str) -> None:
     """Download entire volume as PDF."""
-    from utils import download_volume_as_pdf
-    
-    await safe_callback_answer(callback)
+    ack_callback(callback)
     if not callback.message:
         return
-    _, manga_id_text, volume = callback.data.split(":")
-    manga_id = int(manga_id_text)
     
-    client = get_client()
-    store = get_favorites()
-    
-    detail = await run_sync(client.get_manga_detail, manga_id)
+    detail, chapters = await client.get_manga_full(manga_id)
     manga_title = detail.title if detail else "Manga"
     
-    chapters = await run_sync(client.get_manga_chapters, manga_id)
     vol_chapters = [ch for ch in chapters if str(ch.get("vol")) == volume]
     
     if not vol_chapters:
@@ -794,21 +838,18 @@ async def download_volume_pdf(callback: CallbackQuery) -> None:
     except (ValueError, TypeError):
         pass
     
-    file_name = f"{manga_title} - Том {volume}.pdf"
+    base_name = f"{manga_title} - Том {volume}"
+    file_name = f"{base_name}.pdf"
+    caption = f"📕 {base_name}"
     
     # Check cache first
     cached_file_id = store.get_cached_volume(manga_id, volume, "pdf")
     if cached_file_id:
-        try:
-            await callback.message.delete()
-        except Exception:
-            pass
-        await callback.message.answer_document(cached_file_id, caption=f"📕 {manga_title} - Том {volume}")
+        await replace_with_document(callback.message, cached_file_id, caption)
         # Mark all chapters in volume as read
-        for ch in vol_chapters:
-            ch_id = ch.get("id")
-            ch_name = chapter_title(ch)
-            store.mark_chapter_read(callback.from_user.id, manga_id, ch_id, ch_name)
+        mark_read_in_background(
+            callback.from_user.id, manga_id, [(ch.get("id"), chapter_title(ch)) for ch in vol_chapters]
+        )
         return
     
     try:
@@ -823,7 +864,7 @@ async def download_volume_pdf(callback: CallbackQuery) -> None:
     all_pages = []
     for ch in vol_chapters:
         chapter_id = ch.get("id")
-        pages = await run_sync(client.get_chapter_pages, manga_id, chapter_id)
+        pages = await client.get_chapter_pages(manga_id, chapter_id)
         if pages:
             all_pages.extend(pages)
     
@@ -836,7 +877,7 @@ async def download_volume_pdf(callback: CallbackQuery) -> None:
     
     # First try without compression
     progress_cb = create_progress_callback(callback.message)
-    pdf_path = await download_volume_as_pdf(all_pages, f"{manga_title} - Том {volume}", progress_callback=progress_cb)
+    pdf_path = await download_volume_as_pdf(all_pages, base_name, progress_callback=progress_cb)
     
     if not pdf_path or not os.path.exists(pdf_path):
         try:
@@ -877,7 +918,7 @@ async def download_volume_pdf(callback: CallbackQuery) -> None:
             progress_cb = create_progress_callback(callback.message)
             pdf_path = await download_volume_as_pdf(
                 all_pages, 
-                f"{manga_title} - Том {volume}", 
+                base_name, 
                 compress=True,
                 max_dimension=1600,
                 quality=70,
@@ -911,7 +952,7 @@ async def download_volume_pdf(callback: CallbackQuery) -> None:
                 return
             
             # Mark as compressed in filename
-            file_name = f"{manga_title} - Том {volume} (сжатый).pdf"
+            file_name = f"{base_name} (сжатый).pdf"
     
     try:
         if use_telethon:
@@ -925,7 +966,7 @@ async def download_volume_pdf(callback: CallbackQuery) -> None:
             sent, file_id = await send_large_file(
                 chat_id=callback.from_user.id,
                 file_path=pdf_path,
-                caption=f"📕 {manga_title} - Том {volume}",
+                caption=caption,
                 message_callback=upload_progress_cb
             )
             
@@ -946,25 +987,20 @@ async def download_volume_pdf(callback: CallbackQuery) -> None:
             
             # Cache file_id from Telethon (compatible with aiogram)
             if file_id:
-                store.cache_volume(manga_id, volume, "pdf", file_id, file_name)
+                await run_db(store.cache_volume, manga_id, volume, "pdf", file_id, file_name)
         else:
             # Send via aiogram (Bot API)
             pdf_file = FSInputFile(pdf_path, filename=file_name)
-            try:
-                await callback.message.delete()
-            except Exception:
-                pass
-            sent_msg = await callback.message.answer_document(pdf_file, caption=f"📕 {manga_title} - Том {volume}")
+            sent_msg = await replace_with_document(callback.message, pdf_file, caption)
             
             # Cache file_id
             if sent_msg.document:
-                store.cache_volume(manga_id, volume, "pdf", sent_msg.document.file_id, file_name)
+                await run_db(store.cache_volume, manga_id, volume, "pdf", sent_msg.document.file_id, file_name)
         
         # Mark all chapters in volume as read
-        for ch in vol_chapters:
-            ch_id = ch.get("id")
-            ch_name = chapter_title(ch)
-            store.mark_chapter_read(callback.from_user.id, manga_id, ch_id, ch_name)
+        mark_read_in_background(
+            callback.from_user.id, manga_id, [(ch.get("id"), chapter_title(ch)) for ch in vol_chapters]
+        )
     except Exception as e:
         if "Too Large" in str(e) or "EntityTooLarge" in str(type(e).__name__):
             try:
@@ -985,24 +1021,17 @@ async def download_volume_pdf(callback: CallbackQuery) -> None:
             os.remove(pdf_path)
 
 
-@router.callback_query(F.data.startswith("dl_vol_cbz:"))
-async def download_volume_cbz(callback: CallbackQuery) -> None:
+@serialized_per_chat
+@single_build
+async def download_volume_cbz(callback: CallbackQuery, manga_id: int, volume: str) -> None:
     """Download entire volume as CBZ."""
-    from utils import download_volume_as_cbz
-    
-    await safe_callback_answer(callback)
+    ack_callback(callback)
     if not callback.message:
         return
-    _, manga_id_text, volume = callback.data.split(":")
-    manga_id = int(manga_id_text)
-    
-    client = get_client()
-    store = get_favorites()
     
-    detail = await run_sync(client.get_manga_detail, manga_id)
+    detail, chapters = await client.get_manga_full(manga_id)
     manga_title = detail.title if detail else "Manga"
     
-    chapters = await run_sync(client.get_manga_chapters, manga_id)
     vol_chapters = [ch for ch in chapters if str(ch.get("vol")) == volume]
     
     if not vol_chapters:
@@ -1018,21 +1047,18 @@ async def download_volume_cbz(callback: CallbackQuery) -> None:
     except (ValueError, TypeError):
         pass
     
-    file_name = f"{manga_title} - Том {volume}.cbz"
+    base_name = f"{manga_title} - Том {volume}"
+    file_name = f"{base_name}.cbz"
+    caption = f"📦 {base_name}"
     
     # Check cache first
     cached_file_id = store.get_cached_volume(manga_id, volume, "cbz")
     if cached_file_id:
-        try:
-            await callback.message.delete()
-        except Exception:
-            pass
-        await callback.message.answer_document(cached_file_id, caption=f"📦 {manga_title} - Том {volume}")
+        await replace_with_document(callback.message, cached_file_id, caption)
         # Mark all chapters in volume as read
-        for ch in vol_chapters:
-            ch_id = ch.get("id")
-            ch_name = chapter_title(ch)
-            store.mark_chapter_read(callback.from_user.id, manga_id, ch_id, ch_name)
+        mark_read_in_background(
+            callback.from_user.id, manga_id, [(ch.get("id"), chapter_title(ch)) for ch in vol_chapters]
+        )
         return
     
     try:
@@ -1048,13 +1074,11 @@ async def download_volume_cbz(callback: CallbackQuery) -> None:
     for ch in vol_chapters:
         chapter_id = ch.get("id")
         ch_name = chapter_title(ch)
-        pages = await run_sync(client.get_chapter_pages, manga_id, chapter_id)
+        pages = await client.get_chapter_pages(manga_id, chapter_id)
         if pages:
-            for page in pages:
-                # Extract URL from page dict
-                url = page.get("img") or page.get("image") or page.get("url")
-                if url:
-                    pages_with_info.append({"url": url, "chapter": ch_name})
+            pages_with_info.extend(
+                {"url": url, "chapter": ch_name} for page in pages if (url := page_url(page))
+            )
     
     if not pages_with_info:
         try:
@@ -1065,7 +1089,7 @@ async def download_volume_cbz(callback: CallbackQuery) -> None:
     
     # First try without compression
     progress_cb = create_progress_callback(callback.message)
-    cbz_path = await download_volume_as_cbz(pages_with_info, f"{manga_title} - Том {volume}", progress_callback=progress_cb)
+    cbz_path = await download_volume_as_cbz(pages_with_info, base_name, progress_callback=progress_cb)
     
     if not cbz_path or not os.path.exists(cbz_path):
         try:
@@ -1106,7 +1130,7 @@ async def download_volume_cbz(callback: CallbackQuery) -> None:
             progress_cb = create_progress_callback(callback.message)
             cbz_path = await download_volume_as_cbz(
                 pages_with_info, 
-                f"{manga_title} - Том {volume}",
+                base_name,
                 compress=True,
                 max_dimension=1600,
                 quality=70,
@@ -1140,7 +1164,7 @@ async def download_volume_cbz(callback: CallbackQuery) -> None:
                 return
             
             # Mark as compressed in filename
-            file_name = f"{manga_title} - Том {volume} (сжатый).cbz"
+            file_name = f"{base_name} (сжатый).cbz"
     
     try:
         if use_telethon:
@@ -1154,7 +1178,7 @@ async def download_volume_cbz(callback: CallbackQuery) -> None:
             sent, file_id = await send_large_file(
                 chat_id=callback.from_user.id,
                 file_path=cbz_path,
-                caption=f"📦 {manga_title} - Том {volume}",
+                caption=caption,
                 message_callback=upload_progress_cb
             )
             
@@ -1175,25 +1199,20 @@ async def download_volume_cbz(callback: CallbackQuery) -> None:
             
             # Cache file_id from Telethon (compatible with aiogram)
             if file_id:
-                store.cache_volume(manga_id, volume, "cbz", file_id, file_name)
+                await run_db(store.cache_volume, manga_id, volume, "cbz", file_id, file_name)
         else:
             # Send via aiogram (Bot API)
             cbz_file = FSInputFile(cbz_path, filename=file_name)
-            try:
-                await callback.message.delete()
-            except Exception:
-                pass
-            sent_msg = await callback.message.answer_document(cbz_file, caption=f"📦 {manga_title} - Том {volume}")
+            sent_msg = await replace_with_document(callback.message, cbz_file, caption)
             
             # Cache file_id
             if sent_msg.document:
-                store.cache_volume(manga_id, volume, "cbz", sent_msg.document.file_id, file_name)
+                await run_db(store.cache_volume, manga_id, volume, "cbz", sent_msg.document.file_id, file_name)
         
         # Mark all chapters in volume as read
-        for ch in vol_chapters:
-            ch_id = ch.get("id")
-            ch_name = chapter_title(ch)
-            store.mark_chapter_read(callback.from_user.id, manga_id, ch_id, ch_name)
+        mark_read_in_background(
+            callback.from_user.id, manga_id, [(ch.get("id"), chapter_title(ch)) for ch in vol_chapters]
+        )
     except Exception as e:
         if "Too Large" in str(e) or "EntityTooLarge" in str(type(e).__name__):
             try:
@@ -1212,3 +1231,47 @@ async def download_volume_cbz(callback: CallbackQuery) -> None:
     finally:
         if os.path.exists(cbz_path):
             os.remove(cbz_path)
+
+
+# ============== Callback Dispatch ==============
+
+# Callback data prefix -> (handler, field types); the fields after the prefix
+# are converted once here and passed to handler(callback, *fields). goto_ch
+# stays a separate route because it needs the FSM context
+_DISPATCH = {
+    "manga": (show_manga, (int,)),
+    "fav": (handle_favorite, (str, int)),
+    "chapters": (show_chapters, (int, int)),
+    "chapter": (show_chapter_options, (int, int)),
+    "dl_pdf": (download_pdf, (int, int)),
+    "dl_zip": (download_zip, (int, int)),
+    "read_album": (read_album, (int, int)),
+    "volumes": (show_volumes, (int,)),
+    "vol_format": (show_volume_format, (int, str)),
+    "dl_vol_pdf": (download_volume_pdf, (int, str)),
+    "dl_vol_cbz": (download_volume_cbz, (int, str)),
+}
+
+
+def _match_callback(callback: CallbackQuery) -> dict | bool:
+    """Look up the handler by prefix and parse its fields; malformed data doesn't match."""
+    prefix, _, payload = (callback.data or "").partition(":")
+    route = _DISPATCH.get(prefix)
+    if route is None:
+        return False
+    handler, types = route
+    # The last field keeps any further ':' (volume names are free text)
+    fields = payload.split(":", len(types) - 1)
+    if len(fields) != len(types):
+        return False
+    try:
+        args = tuple(convert(field) for convert, field in zip(types, fields))
+    except ValueError:
+        return False
+    return {"route": handler, "args": args}
+
+
+@router.callback_query(_match_callback)
+async def dispatch_callback(callback: CallbackQuery, route, args: tuple) -> None:
+    """Route manga callbacks with one dict lookup instead of a filter per handler."""
+    await route(callback, *args)
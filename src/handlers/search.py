@@ -1,6 +1,8 @@
 """Search handlers: keywords, genres, new, popular."""
 from __future__ import annotations
 
+import time
+
 from aiogram import F, Router
 from aiogram.fsm.context import FSMContext
 from aiogram.types import CallbackQuery, InlineKeyboardMarkup, Message
@@ -8,12 +10,15 @@ from aiogram.filters import Command
 
 from config import GENRES
 from keyboards import build_genre_keyboard, build_search_results
-from states import SearchStates
-from dependencies import get_client
-from utils import run_sync, safe_callback_answer
+from states import SEARCH_STATE, _UserSearch
+from desu_client import DesuClient
+from utils import ack_callback
 
 router = Router()
 
+# Bound by handlers.setup_routers() once dependencies are initialized
+client: DesuClient
+
 # Store search results in memory (per-user cache)
 _search_cache: dict[int, tuple[str, str, list]] = {}  # user_id -> (search_type, query, results)
 
@@ -23,6 +28,26 @@ def _cache_results(user_id: int, search_type: str, query: str, results: list) ->
     _search_cache[user_id] = (search_type, query, results)
 
 
+# New/popular lists change over hours, so share them between users briefly
+_QUICK_SEARCH_TTL = 120  # seconds
+_quick_search_cache: dict[str, tuple[float, list]] = {}  # search_type -> (expires_at, results)
+
+
+async def _quick_search(search_type: str) -> list:
+    """Get new/popular results, reusing a recent fetch."""
+    now = time.monotonic()
+    cached = _quick_search_cache.get(search_type)
+    if cached and cached[0] > now:
+        return cached[1]
+    results = await client.search_manga(
+        popularity=search_type == "popular",
+        is_new=search_type == "new",
+    )
+    if results:  # Don't keep an empty list from a failed request
+        _quick_search_cache[search_type] = (now + _QUICK_SEARCH_TTL, results)
+    return results
+
+
 def _get_cached(user_id: int) -> tuple[str, str, list] | None:
     """Get cached search results."""
     return _search_cache.get(user_id)
@@ -32,8 +57,7 @@ def _get_cached(user_id: int) -> tuple[str, str, list] | None:
 async def cmd_new(message: Message) -> None:
     """Handle /new command - show new releases."""
     loading_msg = await message.answer("⏳ Загрузка новых релизов...")
-    client = get_client()
-    results = await run_sync(client.search_manga, is_new=True)
+    results = await client.search_manga(is_new=True)
     _cache_results(message.from_user.id, "new", "", results)
     await _edit_search_results(loading_msg, results, "new", "")
 
@@ -42,8 +66,7 @@ async def cmd_new(message: Message) -> None:
 async def cmd_popular(message: Message) -> None:
     """Handle /popular command - show popular manga."""
     loading_msg = await message.answer("⏳ Загрузка популярной манги...")
-    client = get_client()
-    results = await run_sync(client.search_manga, popularity=True)
+    results = await client.search_manga(popularity=True)
     _cache_results(message.from_user.id, "popular", "", results)
     await _edit_search_results(loading_msg, results, "popular", "")
 
@@ -51,8 +74,10 @@ async def cmd_popular(message: Message) -> None:
 @router.callback_query(F.data == "search:keywords")
 async def prompt_keywords(callback: CallbackQuery, state: FSMContext) -> None:
     """Prompt user to enter keywords."""
-    await safe_callback_answer(callback)
-    await state.set_state(SearchStates.keywords)
+    ack_callback(callback)
+    # Leave any other pending flow, as switching FSM state used to
+    await state.clear()
+    SEARCH_STATE[callback.from_user.id] = _UserSearch("keywords")
     if callback.message:
         try:
             await callback.message.edit_text("Отправьте ключевые слова для поиска (например, 'Ван пис').")
@@ -63,7 +88,7 @@ async def prompt_keywords(callback: CallbackQuery, state: FSMContext) -> None:
 @router.callback_query(F.data == "search:genres")
 async def prompt_genres(callback: CallbackQuery, state: FSMContext) -> None:
     """Show genre selection keyboard."""
-    await safe_callback_answer(callback)
+    ack_callback(callback)
     if callback.message:
         try:
             await callback.message.edit_text(
@@ -80,10 +105,10 @@ async def prompt_genres(callback: CallbackQuery, state: FSMContext) -> None:
 @router.callback_query(F.data.startswith("genres_page:"))
 async def show_genres_page(callback: CallbackQuery) -> None:
     """Handle genre pagination."""
-    await safe_callback_answer(callback)
+    ack_callback(callback)
     if not callback.message:
         return
-    page = int(callback.data.split(":")[1])
+    page = int(callback.data.partition(":")[2])
     try:
         await callback.message.edit_text(
             "Выберите жанр:",
@@ -96,10 +121,10 @@ async def show_genres_page(callback: CallbackQuery) -> None:
 @router.callback_query(F.data.startswith("genre:"))
 async def search_by_genre(callback: CallbackQuery) -> None:
     """Search manga by selected genre."""
-    await safe_callback_answer(callback)
+    ack_callback(callback)
     if not callback.message:
         return
-    api_genre = callback.data.split(":", 1)[1]
+    api_genre = callback.data.partition(":")[2]
     display_name = GENRES.get(api_genre, api_genre)
     
     try:
@@ -107,8 +132,7 @@ async def search_by_genre(callback: CallbackQuery) -> None:
     except Exception:
         pass
     
-    client = get_client()
-    results = await run_sync(client.search_manga, genres=[api_genre])
+    results = await client.search_manga(genres=[api_genre])
     _cache_results(callback.from_user.id, "genre", api_genre, results)
     await _edit_search_results(callback.message, results, "genre", api_genre)
 
@@ -116,11 +140,8 @@ async def search_by_genre(callback: CallbackQuery) -> None:
 @router.callback_query(F.data.in_({"search:new", "search:popular"}))
 async def run_quick_search(callback: CallbackQuery) -> None:
     """Handle new/popular quick search."""
-    await safe_callback_answer(callback)
-    client = get_client()
-    popularity = callback.data == "search:popular"
-    is_new = callback.data == "search:new"
-    search_type = "popular" if popularity else "new"
+    ack_callback(callback)
+    search_type = "popular" if callback.data == "search:popular" else "new"
     
     if callback.message:
         try:
@@ -128,20 +149,19 @@ async def run_quick_search(callback: CallbackQuery) -> None:
         except Exception:
             pass
     
-    results = await run_sync(client.search_manga, popularity=popularity, is_new=is_new)
+    results = await _quick_search(search_type)
     _cache_results(callback.from_user.id, search_type, "", results)
     if callback.message:
         await _edit_search_results(callback.message, results, search_type, "")
 
 
-@router.message(SearchStates.keywords)
-async def search_keywords(message: Message, state: FSMContext) -> None:
+@router.message(F.from_user.id.in_(SEARCH_STATE))
+async def search_keywords(message: Message) -> None:
     """Search by keywords."""
-    await state.clear()
+    SEARCH_STATE.pop(message.from_user.id, None)
     query = message.text or ""
     loading_msg = await message.answer("⏳ Поиск...")
-    client = get_client()
-    results = await run_sync(client.search_manga, keywords=query)
+    results = await client.search_manga(keywords=query)
     _cache_results(message.from_user.id, "keywords", query, results)
     await _edit_search_results(loading_msg, results, "keywords", query)
 
@@ -149,19 +169,17 @@ async def search_keywords(message: Message, state: FSMContext) -> None:
 @router.callback_query(F.data.startswith("results:"))
 async def paginate_results(callback: CallbackQuery) -> None:
     """Handle search results pagination."""
-    await safe_callback_answer(callback)
+    ack_callback(callback)
     if not callback.message:
         return
     
     # Parse: results:type:query:page
-    parts = callback.data.split(":")
-    if len(parts) < 4:
+    search_type, _, rest = callback.data.partition(":")[2].partition(":")
+    # Query might contain colons, so the page is taken from the right
+    query, sep, page_text = rest.rpartition(":")
+    if not sep:
         return
-    
-    search_type = parts[1]
-    # Query might contain colons, so join all middle parts
-    page = int(parts[-1])
-    query = ":".join(parts[2:-1])
+    page = int(page_text)
     
     # Get cached results
     cached = _get_cached(callback.from_user.id)
@@ -188,7 +206,7 @@ async def paginate_results(callback: CallbackQuery) -> None:
 @router.callback_query(F.data == "noop")
 async def noop_callback(callback: CallbackQuery) -> None:
     """Handle noop callback (page info button)."""
-    await safe_callback_answer(callback)
+    ack_callback(callback)
 
 
 async def _send_search_results(target: Message, results: list, search_type: str = "search", query: str = "") -> None:
@@ -1,6 +1,8 @@
 """Keyboard builders for the bot."""
 from __future__ import annotations
 
+from functools import lru_cache
+
 from aiogram.types import (
     InlineKeyboardButton,
     InlineKeyboardMarkup,
@@ -9,42 +11,50 @@ from aiogram.types import (
 )
 
 from config import GENRES
+from desu_client import ChapterIndex
 
 
-# Main menu keyboard
-MAIN_MENU = ReplyKeyboardMarkup(
+# Main menu keyboard (constant input, so model_construct skips pydantic validation)
+MAIN_MENU = ReplyKeyboardMarkup.model_construct(
     keyboard=[
-        [KeyboardButton(text="👤 Профиль"), KeyboardButton(text="📚 Каталог"), KeyboardButton(text="🔍 Поиск")],
-        [KeyboardButton(text="🎲 Случайная")]
+        [KeyboardButton.model_construct(text="👤 Профиль"), KeyboardButton.model_construct(text="📚 Каталог"), KeyboardButton.model_construct(text="🔍 Поиск")],
+        [KeyboardButton.model_construct(text="🎲 Случайная")]
     ],
     resize_keyboard=True,
 )
 
 
+# Static menus are identical for every user, so build them once (unvalidated, as above)
+_SEARCH_MENU = InlineKeyboardMarkup.model_construct(
+    inline_keyboard=[
+        [InlineKeyboardButton.model_construct(text="🏷 Жанры", callback_data="search:genres")],
+        [InlineKeyboardButton.model_construct(text="🔤 По названию", callback_data="search:keywords")],
+        [InlineKeyboardButton.model_construct(text="🆕 Новинки", callback_data="search:new")],
+        [InlineKeyboardButton.model_construct(text="🔥 Популярное", callback_data="search:popular")],
+    ]
+)
+
+_CATALOG_MENU = InlineKeyboardMarkup.model_construct(
+    inline_keyboard=[
+        [InlineKeyboardButton.model_construct(text="🆕 Новинки", callback_data="search:new")],
+        [InlineKeyboardButton.model_construct(text="🔥 Популярное", callback_data="search:popular")],
+    ]
+)
+
+
 def build_search_menu() -> InlineKeyboardMarkup:
-    """Build search options menu."""
-    return InlineKeyboardMarkup(
-        inline_keyboard=[
-            [InlineKeyboardButton(text="🏷 Жанры", callback_data="search:genres")],
-            [InlineKeyboardButton(text="🔤 По названию", callback_data="search:keywords")],
-            [InlineKeyboardButton(text="🆕 Новинки", callback_data="search:new")],
-            [InlineKeyboardButton(text="🔥 Популярное", callback_data="search:popular")],
-        ]
-    )
+    """Return search options menu."""
+    return _SEARCH_MENU
 
 
 def build_catalog_menu() -> InlineKeyboardMarkup:
-    """Build catalog menu."""
-    return InlineKeyboardMarkup(
-        inline_keyboard=[
-            [InlineKeyboardButton(text="🆕 Новинки", callback_data="search:new")],
-            [InlineKeyboardButton(text="🔥 Популярное", callback_data="search:popular")],
-        ]
-    )
+    """Return catalog menu."""
+    return _CATALOG_MENU
 
 
+@lru_cache(maxsize=64)
 def build_genre_keyboard(page: int = 1, per_page: int = 12, columns: int = 3) -> InlineKeyboardMarkup:
-    """Build keyboard with genre buttons."""
+    """Build keyboard with genre buttons (GENRES is fixed, so each page is built once)."""
     genre_list = list(GENRES.items())
     start = (page - 1) * per_page
     end = start + per_page
@@ -72,8 +82,20 @@ def build_genre_keyboard(page: int = 1, per_page: int = 12, columns: int = 3) ->
     return InlineKeyboardMarkup(inline_keyboard=rows)
 
 
+@lru_cache(maxsize=4096)
+def _chapter_cb(manga_id: int, chapter_id: int) -> str:
+    """Callback data for a chapter button (reused across page redraws)."""
+    return f"chapter:{manga_id}:{chapter_id}"
+
+
+@lru_cache(maxsize=1024)
+def _chapters_cb(manga_id: int, page: int) -> str:
+    """Callback data for a chapter list page."""
+    return f"chapters:{manga_id}:{page}"
+
+
 def build_chapter_keyboard(
-    chapters: list[dict], 
+    index: ChapterIndex, 
     manga_id: int, 
     page: int, 
     per_page: int = 12, 
@@ -81,38 +103,33 @@ def build_chapter_keyboard(
     read_chapter_ids: set[int] | None = None
 ) -> InlineKeyboardMarkup:
     """Build keyboard with chapter buttons. Read chapters marked with ✅."""
-    from utils import chapter_title
-    
     if read_chapter_ids is None:
         read_chapter_ids = set()
     
+    chapters = index.chapters
     start = (page - 1) * per_page
     end = start + per_page
-    page_chapters = chapters[start:end]
 
-    rows: list[list[InlineKeyboardButton]] = []
-    row: list[InlineKeyboardButton] = []
-    for chapter in page_chapters:
-        chapter_id = chapter.get("id")
-        label = chapter_title(chapter)
-        # Add checkmark if chapter was read
-        if chapter_id in read_chapter_ids:
-            label = f"✅{label}"
-        row.append(InlineKeyboardButton(text=label, callback_data=f"chapter:{manga_id}:{chapter_id}"))
-        if len(row) == columns:
-            rows.append(row)
-            row = []
-    if row:
-        rows.append(row)
+    # Labels come precomputed from the index; read chapters get a checkmark
+    buttons = [
+        InlineKeyboardButton(
+            text=f"✅{label}" if chapter_id in read_chapter_ids else label,
+            callback_data=_chapter_cb(manga_id, chapter_id),
+        )
+        for chapter_id, label in zip(index.ids[start:end], index.labels[start:end])
+    ]
+    rows: list[list[InlineKeyboardButton]] = [
+        buttons[i:i + columns] for i in range(0, len(buttons), columns)
+    ]
 
     navigation: list[InlineKeyboardButton] = []
     if start > 0:
         navigation.append(
-            InlineKeyboardButton(text="◀ Назад", callback_data=f"chapters:{manga_id}:{page - 1}")
+            InlineKeyboardButton(text="◀ Назад", callback_data=_chapters_cb(manga_id, page - 1))
         )
     if end < len(chapters):
         navigation.append(
-            InlineKeyboardButton(text="Далее ▶", callback_data=f"chapters:{manga_id}:{page + 1}")
+            InlineKeyboardButton(text="Далее ▶", callback_data=_chapters_cb(manga_id, page + 1))
         )
     if navigation:
         rows.append(navigation)
@@ -244,15 +261,18 @@ def build_search_results(
 
 # ========== Profile Keyboards ==========
 
+_PROFILE_MENU = InlineKeyboardMarkup.model_construct(
+    inline_keyboard=[
+        [InlineKeyboardButton.model_construct(text="⭐ Избранное", callback_data="profile:favorites")],
+        [InlineKeyboardButton.model_construct(text="📖 История просмотров", callback_data="profile:history")],
+        [InlineKeyboardButton.model_construct(text="⚙️ Настройки", callback_data="profile:settings")],
+    ]
+)
+
+
 def build_profile_menu() -> InlineKeyboardMarkup:
-    """Build main profile menu keyboard."""
-    return InlineKeyboardMarkup(
-        inline_keyboard=[
-            [InlineKeyboardButton(text="⭐ Избранное", callback_data="profile:favorites")],
-            [InlineKeyboardButton(text="📖 История просмотров", callback_data="profile:history")],
-            [InlineKeyboardButton(text="⚙️ Настройки", callback_data="profile:settings")],
-        ]
-    )
+    """Return main profile menu keyboard."""
+    return _PROFILE_MENU
 
 
 def build_favorites_keyboard(favorites: list[dict], page: int = 1, per_page: int = 10) -> InlineKeyboardMarkup:
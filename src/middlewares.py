@@ -2,13 +2,17 @@
 from __future__ import annotations
 
 import time
-from collections import defaultdict
+from collections import OrderedDict, defaultdict, deque
 from typing import Any, Awaitable, Callable, Dict
 
 from aiogram import BaseMiddleware
 from aiogram.types import Message, CallbackQuery, TelegramObject
 
 
+_NS = 1_000_000_000
+_MINUTE_NS = 60 * _NS
+
+
 class ThrottlingMiddleware(BaseMiddleware):
     """
     Advanced anti-spam middleware with:
@@ -25,19 +29,27 @@ class ThrottlingMiddleware(BaseMiddleware):
         max_requests_per_minute: int = 30,  # Max requests per minute
         warn_threshold: int = 3,            # Warnings before temp ban
         ban_duration: int = 60,             # Temp ban duration in seconds
+        max_tracked_users: int = 50_000,    # LRU bound for last-seen times
     ) -> None:
         self.rate_limit = rate_limit
         self.callback_limit = callback_limit
         self.max_requests_per_minute = max_requests_per_minute
         self.warn_threshold = warn_threshold
         self.ban_duration = ban_duration
-        
-        # Tracking dictionaries
-        self.user_last_message: Dict[int, float] = {}
-        self.user_last_callback: Dict[int, float] = {}
-        self.user_requests: Dict[int, list] = defaultdict(list)  # timestamps of requests
+        self.max_tracked_users = max_tracked_users
+        
+        # Precomputed windows in monotonic nanoseconds (integer comparisons)
+        self._rate_limit_ns = int(rate_limit * _NS)
+        self._callback_limit_ns = int(callback_limit * _NS)
+        self._ban_duration_ns = ban_duration * _NS
+        
+        # Tracking dictionaries (times are time.monotonic_ns() values)
+        self.user_last_message: OrderedDict[int, int] = OrderedDict()
+        self.user_last_callback: OrderedDict[int, int] = OrderedDict()
+        # Ring buffer of the last max_requests_per_minute request times per user
+        self.user_requests: Dict[int, deque] = defaultdict(lambda: deque(maxlen=max_requests_per_minute))
         self.user_warnings: Dict[int, int] = defaultdict(int)
-        self.user_banned_until: Dict[int, float] = {}
+        self.user_banned_until: Dict[int, int] = {}
         
         super().__init__()
     
@@ -58,12 +70,12 @@ class ThrottlingMiddleware(BaseMiddleware):
         if user_id is None:
             return await handler(event, data)
         
-        current_time = time.time()
+        current_time = time.monotonic_ns()
         
         # Check if user is banned
         if user_id in self.user_banned_until:
             if current_time < self.user_banned_until[user_id]:
-                remaining = int(self.user_banned_until[user_id] - current_time)
+                remaining = (self.user_banned_until[user_id] - current_time) // _NS
                 if isinstance(event, CallbackQuery):
                     try:
                         await event.answer(f"🚫 Подожди {remaining} сек.", show_alert=True)
@@ -82,19 +94,19 @@ class ThrottlingMiddleware(BaseMiddleware):
         
         # Check rate limit (min interval)
         if isinstance(event, Message):
-            last_time = self.user_last_message.get(user_id, 0)
-            limit = self.rate_limit
+            last_time = self.user_last_message.get(user_id)
+            limit = self._rate_limit_ns
         else:
-            last_time = self.user_last_callback.get(user_id, 0)
-            limit = self.callback_limit
+            last_time = self.user_last_callback.get(user_id)
+            limit = self._callback_limit_ns
         
         # Too fast?
-        if current_time - last_time < limit:
+        if last_time is not None and current_time - last_time < limit:
             self.user_warnings[user_id] += 1
             
             if self.user_warnings[user_id] >= self.warn_threshold:
                 # Temporary ban
-                self.user_banned_until[user_id] = current_time + self.ban_duration
+                self.user_banned_until[user_id] = current_time + self._ban_duration_ns
                 if isinstance(event, CallbackQuery):
                     try:
                         await event.answer(f"🚫 Слишком быстро! Бан на {self.ban_duration} сек.", show_alert=True)
@@ -115,14 +127,16 @@ class ThrottlingMiddleware(BaseMiddleware):
             return None
         
         # Check requests per minute
-        minute_ago = current_time - 60
-        self.user_requests[user_id] = [t for t in self.user_requests[user_id] if t > minute_ago]
+        # The buffer holds the last N requests, so the limit is hit when
+        # it is full and its oldest entry is still within the minute
+        minute_ago = current_time - _MINUTE_NS
+        requests = self.user_requests[user_id]
         
-        if len(self.user_requests[user_id]) >= self.max_requests_per_minute:
+        if len(requests) == requests.maxlen and requests[0] > minute_ago:
             self.user_warnings[user_id] += 1
             
             if self.user_warnings[user_id] >= self.warn_threshold:
-                self.user_banned_until[user_id] = current_time + self.ban_duration
+                self.user_banned_until[user_id] = current_time + self._ban_duration_ns
                 if isinstance(event, CallbackQuery):
                     try:
                         await event.answer(f"🚫 Лимит запросов! Бан на {self.ban_duration} сек.", show_alert=True)
@@ -143,16 +157,17 @@ class ThrottlingMiddleware(BaseMiddleware):
             return None
         
         # Record this request
-        self.user_requests[user_id].append(current_time)
+        requests.append(current_time)
         
-        # Update last action time
-        if isinstance(event, Message):
-            self.user_last_message[user_id] = current_time
-        else:
-            self.user_last_callback[user_id] = current_time
+        # Update last action time, keeping the most recent users at the end
+        last_seen = self.user_last_message if isinstance(event, Message) else self.user_last_callback
+        last_seen[user_id] = current_time
+        last_seen.move_to_end(user_id)
+        if len(last_seen) > self.max_tracked_users:
+            last_seen.popitem(last=False)
         
         # Decay warnings over time (if user behaves)
-        if self.user_warnings[user_id] > 0 and len(self.user_requests[user_id]) < 10:
+        if self.user_warnings[user_id] > 0 and sum(t > minute_ago for t in requests) < 10:
             self.user_warnings[user_id] = max(0, self.user_warnings[user_id] - 1)
         
         # Periodic cleanup (every ~1000 users)
@@ -161,21 +176,20 @@ class ThrottlingMiddleware(BaseMiddleware):
         
         return await handler(event, data)
     
-    def _cleanup(self, current_time: float) -> None:
+    def _cleanup(self, current_time: int) -> None:
         """Remove old entries to prevent memory leaks."""
-        cutoff = current_time - 120  # 2 minutes
+        cutoff = current_time - 2 * _MINUTE_NS
         
-        # Clean request history
+        # Clean request history (newest timestamp is at the end)
         to_remove = [uid for uid, times in self.user_requests.items() 
-                     if not times or max(times) < cutoff]
+                     if not times or times[-1] < cutoff]
         for uid in to_remove:
             del self.user_requests[uid]
         
-        # Clean last message/callback times
+        # Clean last message/callback times (ordered oldest first)
         for d in [self.user_last_message, self.user_last_callback]:
-            to_remove = [uid for uid, t in d.items() if t < cutoff]
-            for uid in to_remove:
-                del d[uid]
+            while d and next(iter(d.values())) < cutoff:
+                d.popitem(last=False)
         
         # Clean expired bans
         to_remove = [uid for uid, t in self.user_banned_until.items() if t < current_time]
@@ -1,9 +1,18 @@
 """FSM States for the bot."""
+from dataclasses import dataclass
+
 from aiogram.fsm.state import State, StatesGroup
 
 
-class SearchStates(StatesGroup):
-    keywords = State()
+@dataclass(slots=True)
+class _UserSearch:
+    """Pending search prompt: the user's next text message is the query."""
+    mode: str
+
+
+# Single-step search prompt kept outside FSM storage: a plain dict pop per
+# message instead of the storage lock and state rewrite on every search
+SEARCH_STATE: dict[int, _UserSearch] = {}
 
 
 class ChapterStates(StatesGroup):
@@ -3,21 +3,102 @@ from __future__ import annotations
 
 import asyncio
 import logging
+import time
 from typing import TYPE_CHECKING
 
 from aiogram import Bot
 
+import config
 from dependencies import get_client, get_favorites
-from utils import run_sync
+from utils import SEND_LIMITER, create_background_task, evict_image_cache, run_db, run_sync
 
 if TYPE_CHECKING:
+    from aiogram.types import User
     from favorites import FavoritesStore
     from desu_client import DesuClient
 
 logger = logging.getLogger(__name__)
 
-# Global flag to control task
-_check_task_running = False
+# Set by stop_periodic_check() to wake the periodic tasks and end them immediately
+_stop_event = asyncio.Event()
+# Set by request_chapter_check() to bring the next chapter check forward
+_wake_event = asyncio.Event()
+# Early checks never start sooner than this after the previous one
+CHECK_MIN_INTERVAL = 300  # seconds
+
+
+# Max manga checked at once (keeps the Desu API load reasonable)
+CHECK_CONCURRENCY = 8
+
+
+async def _check_manga(
+    bot: Bot,
+    store: FavoritesStore,
+    client: DesuClient,
+    manga_id: int,
+    data: dict,
+    last_count: int | None,
+    muted_users: set[int],
+) -> int | None:
+    """Check one manga for new chapters and notify its followers.
+    
+    Returns the chapter count to store, or None if it is unchanged.
+    """
+    try:
+        # Get current chapter count from API
+        chapters = await client.get_manga_chapters(manga_id, use_cache=False)
+        current_count = len(chapters) if chapters else 0
+        
+        if last_count is None:
+            # First time checking this manga, just save count
+            return current_count
+        
+        if current_count > last_count:
+            # New chapters detected!
+            new_chapters = current_count - last_count
+            
+            # Get latest chapter info
+            latest_chapter = chapters[0] if chapters else None
+            ch_info = ""
+            if latest_chapter:
+                ch_num = latest_chapter.get("ch") or latest_chapter.get("vol") or ""
+                ch_info = f"\n📖 Последняя: Глава {ch_num}" if ch_num else ""
+            
+            # Notify all users who have this manga in favorites
+            message = (
+                f"🔔 <b>Новые главы!</b>\n\n"
+                f"📚 <b>{data['title']}</b>\n"
+                f"➕ Добавлено глав: {new_chapters}{ch_info}"
+            )
+            
+            from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+            keyboard = InlineKeyboardMarkup(inline_keyboard=[
+                [InlineKeyboardButton(text="📖 Открыть", callback_data=f"manga:{manga_id}")]
+            ])
+            
+            for user_id in data["users"]:
+                if user_id in muted_users:
+                    continue
+                
+                try:
+                    # Manga are checked concurrently; the bot-wide bucket keeps
+                    # an update burst under Telegram's send limit
+                    await SEND_LIMITER.acquire()
+                    await bot.send_message(
+                        user_id,
+                        message,
+                        reply_markup=keyboard,
+                        parse_mode="HTML"
+                    )
+                    logger.info(f"Sent notification to {user_id} about {data['title']}")
+                except Exception as e:
+                    logger.warning(f"Failed to notify user {user_id}: {e}")
+                    await run_db(store.log_error, "notification", str(e), f"user_id={user_id}, manga_id={manga_id}")
+            return current_count
+    except Exception as e:
+        logger.error(f"Error checking manga {manga_id}: {e}")
+        await run_db(store.log_error, "chapter_check", str(e), f"manga_id={manga_id}")
+    return None
 
 
 async def check_new_chapters(bot: Bot) -> None:
@@ -27,95 +108,180 @@ async def check_new_chapters(bot: Bot) -> None:
     
     # Get all unique manga from favorites
     manga_data = {}  # manga_id -> (title, [user_ids])
-    for manga_id, user_id, title in store.get_all_favorite_manga_ids():
+    for manga_id, user_id, title in await run_db(store.get_all_favorite_manga_ids):
         if manga_id not in manga_data:
             manga_data[manga_id] = {"title": title, "users": []}
         manga_data[manga_id]["users"].append(user_id)
     
     logger.info(f"Checking {len(manga_data)} manga for new chapters...")
     
-    for manga_id, data in manga_data.items():
-        try:
-            # Get current chapter count from API
-            chapters = await run_sync(client.get_manga_chapters, manga_id)
-            current_count = len(chapters) if chapters else 0
-            
-            # Get last known count
-            last_count = store.get_manga_chapter_count(manga_id)
-            
-            if last_count is None:
-                # First time checking this manga, just save count
-                store.set_manga_chapter_count(manga_id, current_count)
-                continue
-            
-            if current_count > last_count:
-                # New chapters detected!
-                new_chapters = current_count - last_count
-                store.set_manga_chapter_count(manga_id, current_count)
-                
-                # Get latest chapter info
-                latest_chapter = chapters[0] if chapters else None
-                ch_info = ""
-                if latest_chapter:
-                    ch_num = latest_chapter.get("ch") or latest_chapter.get("vol") or ""
-                    ch_info = f"\n📖 Последняя: Глава {ch_num}" if ch_num else ""
-                
-                # Notify all users who have this manga in favorites
-                message = (
-                    f"🔔 <b>Новые главы!</b>\n\n"
-                    f"📚 <b>{data['title']}</b>\n"
-                    f"➕ Добавлено глав: {new_chapters}{ch_info}"
-                )
-                
-                from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-                keyboard = InlineKeyboardMarkup(inline_keyboard=[
-                    [InlineKeyboardButton(text="📖 Открыть", callback_data=f"manga:{manga_id}")]
-                ])
-                
-                for user_id in data["users"]:
-                    # Check if user has notifications enabled
-                    if not store.is_notifications_enabled(user_id):
-                        continue
-                    
-                    try:
-                        await bot.send_message(
-                            user_id,
-                            message,
-                            reply_markup=keyboard,
-                            parse_mode="HTML"
-                        )
-                        logger.info(f"Sent notification to {user_id} about {data['title']}")
-                    except Exception as e:
-                        logger.warning(f"Failed to notify user {user_id}: {e}")
-                        store.log_error("notification", str(e), f"user_id={user_id}, manga_id={manga_id}")
-            
-            # Small delay to avoid API rate limits
-            await asyncio.sleep(0.5)
-            
-        except Exception as e:
-            logger.error(f"Error checking manga {manga_id}: {e}")
-            store.log_error("chapter_check", str(e), f"manga_id={manga_id}")
+    last_counts = await run_db(store.get_all_manga_chapter_counts)
+    # One lookup for the whole check instead of one per follower
+    muted_users = await run_db(store.get_notifications_disabled_users)
+    semaphore = asyncio.Semaphore(CHECK_CONCURRENCY)
+    # Filled as each manga's notifications go out
+    new_counts: dict[int, int] = {}
+    
+    async def check_one(manga_id: int, data: dict) -> None:
+        async with semaphore:
+            count = await _check_manga(
+                bot, store, client, manga_id, data, last_counts.get(manga_id), muted_users
+            )
+        if count is not None:
+            new_counts[manga_id] = count
+    
+    try:
+        await asyncio.gather(*(check_one(manga_id, data) for manga_id, data in manga_data.items()))
+    finally:
+        # Written together in one transaction, including when the check is
+        # cancelled midway, so the next run doesn't repeat sent notifications
+        if new_counts:
+            await run_db(store.set_manga_chapter_counts, new_counts)
+
+
+def request_chapter_check() -> None:
+    """Run the next chapter check early, e.g. so a new favorite gets its baseline count."""
+    _wake_event.set()
+
+
+async def _wait_any(events: tuple[asyncio.Event, ...], timeout: float) -> None:
+    """Wait until one of events is set or timeout seconds pass."""
+    if timeout <= 0:
+        return
+    waiters = [asyncio.ensure_future(event.wait()) for event in events]
+    try:
+        await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for waiter in waiters:
+            waiter.cancel()
 
 
 async def periodic_chapter_check(bot: Bot, interval_seconds: int = 3600) -> None:
     """Run chapter check periodically (default: every hour)."""
-    global _check_task_running
-    _check_task_running = True
+    _stop_event.clear()
     
     logger.info(f"Starting periodic chapter check (interval: {interval_seconds}s)")
     
-    while _check_task_running:
+    while not _stop_event.is_set():
+        started = time.monotonic()
+        # Requests made from here on are served by this check; later ones
+        # stay set and bring the next check forward
+        _wake_event.clear()
         try:
             await check_new_chapters(bot)
         except Exception as e:
             logger.error(f"Error in periodic check: {e}")
             store = get_favorites()
-            store.log_error("periodic_check", str(e))
+            await run_db(store.log_error, "periodic_check", str(e))
         
-        await asyncio.sleep(interval_seconds)
+        # Sleep until the next check; stop ends the loop at once, while a
+        # check request starts the next one early, but not within CHECK_MIN_INTERVAL
+        await _wait_any((_stop_event, _wake_event), interval_seconds)
+        if _wake_event.is_set():
+            await _wait_any((_stop_event,), started + CHECK_MIN_INTERVAL - time.monotonic())
+
+
+async def periodic_image_cache_eviction(interval_seconds: int = 3600) -> None:
+    """Trim the page image disk cache to its size budget periodically."""
+    max_bytes = config.IMAGE_CACHE_MAX_MB * 1024 * 1024
+    
+    while not _stop_event.is_set():
+        try:
+            removed = await run_sync(evict_image_cache, max_bytes)
+            if removed:
+                logger.info(f"Evicted {removed} images from disk cache")
+        except Exception as e:
+            logger.error(f"Error in image cache eviction: {e}")
+        
+        try:
+            await asyncio.wait_for(_stop_event.wait(), timeout=interval_seconds)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def periodic_db_optimize(interval_seconds: int = 900) -> None:
+    """Prune old errors and run PRAGMA optimize periodically (default: every 15 minutes)."""
+    store = get_favorites()
+    
+    while not _stop_event.is_set():
+        try:
+            await asyncio.wait_for(_stop_event.wait(), timeout=interval_seconds)
+            break
+        except asyncio.TimeoutError:
+            pass
+        try:
+            await run_db(store.clear_old_errors)
+            await run_db(store.optimize)
+        except Exception as e:
+            logger.error(f"Error optimizing database: {e}")
+
+
+# Write-behind buffer for user tracking: user_id -> (username, first_name, last_name).
+# Flushed in one transaction every USER_FLUSH_INTERVAL or once USER_FLUSH_BATCH users pile up
+_pending_users: dict[int, tuple[str | None, str | None, str | None]] = {}
+USER_FLUSH_INTERVAL = 1.0  # seconds
+USER_FLUSH_BATCH = 100
+
+
+def track_user(user: User) -> None:
+    """Record a user's activity without waiting for the database."""
+    _pending_users[user.id] = (user.username, user.first_name, user.last_name)
+    if len(_pending_users) >= USER_FLUSH_BATCH:
+        create_background_task(flush_pending_users())
+
+
+async def flush_pending_users() -> None:
+    """Write buffered user updates to the store."""
+    if not _pending_users:
+        return
+    batch = _pending_users.copy()
+    _pending_users.clear()
+    try:
+        await run_db(get_favorites().add_users_bulk, batch)
+    except Exception as e:
+        logger.error(f"Error flushing {len(batch)} users: {e}")
+        # Keep the batch for the next flush unless a newer update arrived
+        for user_id, names in batch.items():
+            _pending_users.setdefault(user_id, names)
+
+
+# Write-behind buffer for manga views: (user_id, manga_id) -> (title, cover, viewed_at).
+# The view time is taken here, so history order survives the batching
+_pending_views: dict[tuple[int, int], tuple[str, str | None, float]] = {}
+
+
+def track_manga_view(user_id: int, manga_id: int, title: str, cover: str | None) -> None:
+    """Record a manga view in the user's history without waiting for the database."""
+    _pending_views[(user_id, manga_id)] = (title, cover, time.time())
+    if len(_pending_views) >= USER_FLUSH_BATCH:
+        create_background_task(flush_pending_views())
+
+
+async def flush_pending_views() -> None:
+    """Write buffered manga views to the store."""
+    if not _pending_views:
+        return
+    batch = _pending_views.copy()
+    _pending_views.clear()
+    try:
+        await run_db(get_favorites().add_manga_views_bulk, batch)
+    except Exception as e:
+        logger.error(f"Error flushing {len(batch)} manga views: {e}")
+        for key, view in batch.items():
+            _pending_views.setdefault(key, view)
+
+
+async def periodic_user_flush(interval_seconds: float = USER_FLUSH_INTERVAL) -> None:
+    """Flush buffered user updates and manga views periodically, and once more on stop."""
+    while not _stop_event.is_set():
+        try:
+            await asyncio.wait_for(_stop_event.wait(), timeout=interval_seconds)
+        except asyncio.TimeoutError:
+            pass
+        await flush_pending_users()
+        await flush_pending_views()
 
 
 def stop_periodic_check() -> None:
-    """Stop the periodic check task."""
-    global _check_task_running
-    _check_task_running = False
+    """Stop the periodic background tasks."""
+    _stop_event.set()
@@ -2,18 +2,27 @@
 from __future__ import annotations
 
 import asyncio
+import contextlib
+import functools
+import hashlib
 import io
 import logging
+import multiprocessing
 import os
+import re
 import tempfile
+import time
 import zipfile
-from typing import Callable, Awaitable
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import IO, Any, Callable, Awaitable
 
-import requests
+import aiohttp
+import img2pdf
 from PIL import Image
 from aiogram.types import CallbackQuery
 
-from desu_client import MangaDetail
+import config
+from desu_client import MangaDetail, chapter_title  # chapter_title re-exported for handlers
 
 logger = logging.getLogger(__name__)
 
@@ -29,6 +38,55 @@ async def safe_callback_answer(callback: CallbackQuery, text: str | None = None,
         pass  # Query expired or already answered
 
 
+# Strong references to fire-and-forget tasks so they aren't garbage-collected mid-flight
+_background_tasks: set[asyncio.Task] = set()
+
+
+def create_background_task(coro) -> asyncio.Task:
+    """Schedule a coroutine without awaiting it, keeping the task alive until done."""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+def ack_callback(callback: CallbackQuery) -> None:
+    """Answer callback query in the background so handler work starts at once."""
+    create_background_task(safe_callback_answer(callback))
+
+
+class RateLimiter:
+    """Token bucket: `rate` acquisitions per second, bursting up to `capacity`."""
+    
+    def __init__(self, rate: float, capacity: float | None = None) -> None:
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()  # Waiters are served in arrival order
+    
+    async def acquire(self, tokens: float = 1) -> None:
+        """Wait until `tokens` are available (at most `capacity`) and take them."""
+        if tokens > self.capacity:
+            # The bucket never fills past capacity, so this would wait forever
+            raise ValueError(f"Cannot acquire {tokens} tokens, capacity is {self.capacity}")
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+
+# Bot-wide pacing for uploads (documents, albums): Telegram allows about 30
+# messages/s, and bursts past that come back as RetryAfter with 1-5 s waits
+TELEGRAM_SEND_RATE = 30
+SEND_LIMITER = RateLimiter(TELEGRAM_SEND_RATE)
+
+
 # Lazy import to avoid circular imports
 _favorites_store = None
 
@@ -42,49 +100,90 @@ def _get_store():
 
 
 def log_error(error_type: str, message: str, context: str | None = None) -> None:
-    """Log error to database and logger."""
+    """Log error to logger, and queue it for the database without waiting."""
     logger.error(f"{error_type}: {message} (context: {context})")
     try:
         store = _get_store()
         if store:
-            store.log_error(error_type, message, context)
+            # Callable from the loop or any worker thread; the write itself
+            # happens on the database thread like every other store call
+            DB_EXECUTOR.submit(store.log_error, error_type, message, context)
     except Exception:
         pass  # Don't fail if logging fails
 
 
+# Dedicated pool for blocking disk-cache and file I/O, so it doesn't
+# compete with the loop's default executor (capped at cpu + 4 workers)
+IO_EXECUTOR = ThreadPoolExecutor(max_workers=32, thread_name_prefix="desu-io")
+
+
 async def run_sync(func, *args, **kwargs):
-    """Run sync function in thread pool."""
-    return await asyncio.to_thread(func, *args, **kwargs)
+    """Run sync function in the I/O thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(IO_EXECUTOR, functools.partial(func, *args, **kwargs))
+
+
+# Single thread for FavoritesStore calls: DB work never waits behind image
+# decoding in IO_EXECUTOR, and writes run in the order they were issued
+DB_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="favdb")
+
+
+async def run_db(func, *args, **kwargs):
+    """Run a FavoritesStore method in the database thread."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(DB_EXECUTOR, functools.partial(func, *args, **kwargs))
+
+
+# Worker processes for CPU-bound file assembly (img2pdf is pure Python and
+# holds the GIL); spawned rather than forked since the bot is multi-threaded
+CPU_WORKERS = 2
+# Chapter PDFs are built in a worker process only when their pages total
+# more than this; smaller ones are mostly copying and stay in the I/O pool
+PDF_PROCESS_POOL_MIN_BYTES = 64 * 1024 * 1024
+_cpu_executor: ProcessPoolExecutor | None = None
+
+
+async def run_cpu(func, *args):
+    """Run a picklable top-level function in the worker process pool."""
+    global _cpu_executor
+    if _cpu_executor is None:
+        _cpu_executor = ProcessPoolExecutor(
+            max_workers=CPU_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_cpu_executor, func, *args)
+
 
+async def is_in_favorites(store, user_id: int, manga_id: int) -> bool:
+    """store.has() served from its cache, going to the database thread only on a miss."""
+    cached = store.cached_has(user_id, manga_id)
+    return cached if cached is not None else await run_db(store.has, user_id, manga_id)
 
-def chapter_title(chapter: dict) -> str:
-    """Format chapter title from API data."""
-    number = chapter.get("ch") or chapter.get("chapter") or chapter.get("number")
-    vol = chapter.get("vol")
-    title = chapter.get("title")
+
+def shutdown_executor() -> None:
+    """Stop the I/O thread pool without waiting for running calls.
     
-    if number:
-        label = f"Ch.{number}"
-        if vol:
-            label = f"V{vol} {label}"
-        return label
-    return title or "Chapter"
+    The database thread is drained instead, so queued writes still land.
+    """
+    IO_EXECUTOR.shutdown(wait=False, cancel_futures=True)
+    DB_EXECUTOR.shutdown(wait=True)
+    if _cpu_executor is not None:
+        _cpu_executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Header template for manga captions, bound once at import
+_DETAIL_HEADER = "{title}\nYear: {year}\nGenres: {genres}\nChapters: {chapters}\nRating: {rating}\n\n".format_map
 
 
 def format_manga_detail(detail: MangaDetail, max_length: int = 1000) -> str:
     """Format manga detail for display."""
-    genres = ", ".join(detail.genres) if detail.genres else "Unknown"
-    year = detail.year or "Unknown"
-    rating = detail.rating or "N/A"
-    chapters = detail.chapters_count or "Unknown"
-    
-    header = (
-        f"{detail.title}\n"
-        f"Year: {year}\n"
-        f"Genres: {genres}\n"
-        f"Chapters: {chapters}\n"
-        f"Rating: {rating}\n\n"
-    )
+    header = _DETAIL_HEADER({
+        "title": detail.title,
+        "year": detail.year or "Unknown",
+        "genres": ", ".join(detail.genres) if detail.genres else "Unknown",
+        "chapters": detail.chapters_count or "Unknown",
+        "rating": detail.rating or "N/A",
+    })
     
     # Truncate description to fit Telegram's 1024 char limit for captions
     available_length = max_length - len(header)
@@ -95,22 +194,248 @@ def format_manga_detail(detail: MangaDetail, max_length: int = 1000) -> str:
     return header + description
 
 
-def download_image(url: str) -> Image.Image | None:
+# desu.uno image CDN rejects requests without a browser UA and Referer
+IMAGE_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
+    "Referer": "https://desu.uno/",
+    "Accept": "image/webp,image/apng,image/*,*/*;q=0.8",
+}
+
+# Max page downloads in flight per chapter
+PAGE_FETCH_CONCURRENCY = 8
+
+# Attempts per page for rate limiting (429), server errors and dropped
+# connections, with exponential backoff (seconds) between them
+PAGE_FETCH_RETRIES = 3
+PAGE_RETRY_BACKOFF = 0.5
+_RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# One session for API calls and image downloads, so keep-alive connections
+# are reused across requests, pages, chapters and users instead of a TLS
+# handshake per request; headers and timeouts are set per request
+_http_session: aiohttp.ClientSession | None = None
+IMAGE_TIMEOUT = aiohttp.ClientTimeout(total=30)
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    """Shared aiohttp session; created on first use inside the running loop."""
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=100,
+            limit_per_host=32,
+            keepalive_timeout=60,
+            ttl_dns_cache=300,
+        )
+        _http_session = aiohttp.ClientSession(connector=connector)
+    return _http_session
+
+
+async def close_http_session() -> None:
+    """Close the shared HTTP session on shutdown."""
+    global _http_session
+    if _http_session is not None and not _http_session.closed:
+        await _http_session.close()
+    _http_session = None
+
+
+# ============== Image Disk Cache ==============
+
+def _image_cache_path(url: str) -> str:
+    """Content-addressed cache path for an image URL."""
+    key = hashlib.sha1(url.encode()).hexdigest()
+    return os.path.join(config.IMAGE_CACHE_DIR, key[:2], key)
+
+
+def _read_cached_image(url: str) -> bytes | None:
+    """Return cached image bytes, marking the entry as recently used."""
+    path = _image_cache_path(url)
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        os.utime(path)  # mtime drives LRU eviction
+        return data
+    except OSError:
+        return None
+
+
+def _write_cached_image(url: str, data: bytes) -> None:
+    """Store image bytes in the cache; failures only cost a future re-download."""
+    path = _image_cache_path(url)
+    tmp_path = None
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Unique per write, so concurrent fetches of one page never share a file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)  # Readers never see a partial file
+    except OSError as e:
+        logger.warning(f"Image cache write failed: {e}")
+        if tmp_path is not None:
+            with contextlib.suppress(OSError):
+                os.remove(tmp_path)
+
+
+def _sniff_content_type(data: bytes) -> str:
+    """Detect image type of cached bytes from their magic number."""
+    if data.startswith(b"\x89PNG"):
+        return "image/png"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data.startswith(b"GIF8"):
+        return "image/gif"
+    return "image/jpeg"
+
+
+def evict_image_cache(max_bytes: int) -> int:
+    """Delete least recently used cached images above max_bytes. Returns files removed."""
+    entries = []
+    total = 0
+    try:
+        with os.scandir(config.IMAGE_CACHE_DIR) as buckets:
+            for bucket in buckets:
+                if not bucket.is_dir():
+                    continue
+                with os.scandir(bucket.path) as files:
+                    for entry in files:
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+                        total += stat.st_size
+    except FileNotFoundError:
+        return 0
+    
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    return removed
+
+
+# Formats the image CDN serves; Image.open only probes these plugins
+PAGE_FORMATS = ("JPEG", "WEBP", "PNG", "GIF")
+
+
+def _decode_image(data: bytes) -> Image.Image:
+    """Decode downloaded image bytes into an RGB PIL Image."""
+    img = Image.open(io.BytesIO(data), formats=PAGE_FORMATS)
+    # convert() always copies, so only call it when the mode differs
+    if img.mode != "RGB":
+        return img.convert("RGB")
+    img.load()
+    return img
+
+
+async def download_image(url: str) -> Image.Image | None:
     """Download image from URL and return PIL Image."""
+    result = await _fetch_image_bytes(url)
+    if result is None:
+        return None
     try:
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
-            "Referer": "https://desu.uno/",
-            "Accept": "image/webp,image/apng,image/*,*/*;q=0.8",
-        }
-        response = requests.get(url, timeout=30, headers=headers)
-        response.raise_for_status()
-        return Image.open(io.BytesIO(response.content)).convert("RGB")
+        return await run_sync(_decode_image, result[1])
     except Exception as e:
-        log_error("image_download", str(e), f"url={url[:100]}")
+        log_error("image_decode", str(e), f"url={url[:100]}")
         return None
 
 
+# PNG modes img2pdf embeds directly; transparency and interlacing make it
+# decode the page itself (or reject it, on older img2pdf releases)
+_PDF_PNG_MODES = frozenset({"1", "L", "P", "RGB"})
+
+
+def _pdf_embeds_png(img: Image.Image) -> bool:
+    """Whether img2pdf can take this opened (not yet decoded) PNG as-is."""
+    return (
+        img.mode in _PDF_PNG_MODES
+        and "transparency" not in img.info
+        and not img.info.get("interlace")
+    )
+
+
+async def _fetch_image_bytes(url: str) -> tuple[str, bytes] | None:
+    """Fetch raw image as (content_type, body), logging and returning None on failure.
+    
+    Served from the disk cache when possible; fresh downloads are written
+    back in the I/O pool without waiting. 429s, 5xx responses and dropped
+    connections are retried with exponential backoff.
+    """
+    data = await run_sync(_read_cached_image, url)
+    if data is not None:
+        return _sniff_content_type(data), data
+    for attempt in range(PAGE_FETCH_RETRIES):
+        try:
+            async with get_http_session().get(url, headers=IMAGE_HEADERS, timeout=IMAGE_TIMEOUT) as response:
+                if response.status not in _RETRY_STATUSES or attempt + 1 == PAGE_FETCH_RETRIES:
+                    response.raise_for_status()
+                    data = await response.read()
+                    IO_EXECUTOR.submit(_write_cached_image, url, data)
+                    return response.content_type, data
+                retry_after = response.headers.get("Retry-After", "")
+            # Back off after the connection is released
+            delay = float(retry_after) if retry_after.isdigit() else PAGE_RETRY_BACKOFF * 2 ** attempt
+            await asyncio.sleep(min(delay, 30))
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            if attempt + 1 < PAGE_FETCH_RETRIES:
+                await asyncio.sleep(PAGE_RETRY_BACKOFF * 2 ** attempt)
+                continue
+            log_error("image_download", str(e), f"url={url[:100]}")
+            return None
+        except Exception as e:
+            log_error("image_download", str(e), f"url={url[:100]}")
+            return None
+    return None
+
+
+async def _download_pages(
+    urls: list[str],
+    chapter_name: str,
+    progress_callback: ProgressCallback | None = None,
+    prepare: Callable[[str, bytes], Any] | None = None,
+) -> list:
+    """Download chapter pages concurrently, keeping page order.
+    
+    Returns raw (content_type, body) pairs; failed pages are None. With
+    prepare, each page is passed through prepare(content_type, body) in the
+    I/O pool as soon as it arrives, so decoding and encoding overlap with
+    the remaining downloads, and its result is returned instead.
+    """
+    total = len(urls)
+    done = 0
+    semaphore = asyncio.Semaphore(PAGE_FETCH_CONCURRENCY)
+    
+    async def fetch(url: str):
+        nonlocal done
+        async with semaphore:
+            result = await _fetch_image_bytes(url)
+        
+        # Outside the semaphore, so the next download starts meanwhile
+        if result is not None and prepare is not None:
+            try:
+                result = await run_sync(prepare, *result)
+            except Exception as e:
+                log_error("image_decode", str(e), f"url={url[:100]}")
+                result = None
+        
+        done += 1
+        # Report progress every 3 pages to avoid spam
+        if progress_callback and done % 3 == 0 and done < total:
+            percent = int((done / total) * 100)
+            logger.info(f"[{chapter_name}] Downloading: {percent}% ({done}/{total})")
+            try:
+                await progress_callback(done, total, f"⏳ Скачивание: {percent}% ({done}/{total})")
+            except Exception:
+                pass
+        return result
+    
+    return await asyncio.gather(*(fetch(url) for url in urls))
+
+
 def resize_image_for_telegram(img: Image.Image, max_dimension: int = 4096) -> Image.Image:
     """Resize image if it exceeds Telegram's limits (max 4096px on any side)."""
     width, height = img.size
@@ -152,140 +477,215 @@ def compress_image_for_volume(img: Image.Image, max_dimension: int = 1800, quali
     return img
 
 
+# Write buffer for generated PDF/CBZ files: a few large writes instead of
+# thousands of small ones while pages are appended
+OUTPUT_BUFFER_SIZE = 1 << 20
+
+
+# Chapter files up to this size are built and uploaded from memory; larger
+# ones are spilled to a temp file (needed anyway for Telethon uploads)
+IN_MEMORY_FILE_LIMIT = 40 * 1024 * 1024
+
+
+@contextlib.contextmanager
+def _open_output(output: str | IO[bytes]):
+    """Yield a writable binary stream for a file path or an already open stream."""
+    if isinstance(output, str):
+        with open(output, "wb", buffering=OUTPUT_BUFFER_SIZE) as f:
+            yield f
+    else:
+        yield output
+
+
+def _write_to_bytes(writer: Callable[[list, IO[bytes]], None], blobs: list) -> bytes:
+    """Run writer(blobs, stream) into memory and return the result."""
+    raw = io.BytesIO()
+    # zipfile and img2pdf emit many small header/object writes; batch them
+    stream = io.BufferedWriter(raw, buffer_size=OUTPUT_BUFFER_SIZE)
+    writer(blobs, stream)
+    stream.flush()
+    stream.detach()
+    return raw.getvalue()
+
+
+def _write_file(path: str, data: bytes) -> None:
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def _remove_partial(path: str) -> None:
+    """Delete an output file left half-written by a failed build."""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
 def create_pdf_from_images(images: list[Image.Image], output_path: str, quality: int = 85) -> None:
     """Create PDF from list of PIL Images."""
     if not images:
         return
     # Convert to RGB if needed and save
     rgb_images = [img.convert("RGB") if img.mode != "RGB" else img for img in images]
-    rgb_images[0].save(output_path, save_all=True, append_images=rgb_images[1:], format="PDF", quality=quality)
+    with open(output_path, "wb", buffering=OUTPUT_BUFFER_SIZE) as f:
+        rgb_images[0].save(f, save_all=True, append_images=rgb_images[1:], format="PDF", quality=quality)
+
+
+# Archive extension for each image content type (desu.uno serves JPEG and WebP)
+_IMAGE_EXTENSIONS = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/webp": ".webp",
+    "image/gif": ".gif",
+}
+
+
+def _page_for_pdf(content_type: str, body: bytes) -> bytes:
+    """Return page bytes img2pdf can embed: JPEGs and plain PNGs as-is, others re-encoded to JPEG."""
+    if content_type == "image/jpeg":
+        return body
+    # Opening only reads the header; pixels are decoded just for re-encoding
+    img = Image.open(io.BytesIO(body), formats=PAGE_FORMATS)
+    if img.format == "PNG" and _pdf_embeds_png(img):
+        return body
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    img_buffer = io.BytesIO()
+    img.save(img_buffer, format="JPEG", quality=85)
+    return img_buffer.getvalue()
+
+
+def create_pdf_from_raw(pages: list[bytes], output: str | IO[bytes]) -> None:
+    """Create PDF from page bytes prepared by _page_for_pdf.
+    
+    img2pdf wraps JPEG and PNG data into the PDF directly, so pages are
+    neither decoded nor re-encoded.
+    """
+    if not pages:
+        return
+    with _open_output(output) as f:
+        img2pdf.convert(pages, outputstream=f)
 
 
-def create_cbz_from_images(images: list[Image.Image], output_path: str, quality: int = 85) -> None:
-    """Create CBZ (Comic Book ZIP) archive from list of PIL Images."""
-    if not images:
+def create_cbz_from_raw(blobs: list[tuple[str, bytes]], output: str | IO[bytes]) -> None:
+    """Create CBZ (Comic Book ZIP) archive from downloaded image bytes as-is.
+    
+    Pages are already compressed images, so they are stored without
+    re-encoding or DEFLATE.
+    """
+    if not blobs:
         return
-    with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as zf:
-        for i, img in enumerate(images, 1):
-            img_buffer = io.BytesIO()
-            img.save(img_buffer, format="JPEG", quality=quality)
-            img_buffer.seek(0)
-            zf.writestr(f"page_{i:03d}.jpg", img_buffer.read())
+    with _open_output(output) as f, zipfile.ZipFile(f, 'w', zipfile.ZIP_STORED) as zf:
+        for i, (content_type, body) in enumerate(blobs, 1):
+            ext = _IMAGE_EXTENSIONS.get(content_type, ".jpg")
+            zf.writestr(f"page_{i:03d}{ext}", body)
 
 
-async def download_chapter_as_pdf(
-    pages: list[dict], 
+# Anything but (Unicode) letters, digits and "._- "; titles are mostly Cyrillic
+_UNSAFE_FILENAME_RE = re.compile(r"[^\w. -]")
+
+
+def safe_filename(name: str) -> str:
+    """Replace characters that are unsafe in file names with '_'."""
+    return _UNSAFE_FILENAME_RE.sub("_", name)
+
+
+def page_url(page: dict | str) -> str | None:
+    """Image URL of an API page entry (dict with 'img'/'image'/'url', or a bare URL)."""
+    if isinstance(page, dict):
+        return page.get("img") or page.get("image") or page.get("url")
+    return page
+
+
+async def _build_chapter_file(
+    pages: list[dict],
     chapter_name: str,
-    progress_callback: ProgressCallback | None = None
-) -> str | None:
-    """Download all pages and create PDF. Returns path to PDF file."""
-    images: list[Image.Image] = []
-    failed_pages = 0
-    total = len(pages)
-    
-    for i, page in enumerate(pages):
-        url = page.get("img") or page.get("image") or page.get("url")
-        if not url:
-            continue
-        
-        # Report progress
-        if progress_callback and i % 3 == 0:  # Update every 3 pages to avoid spam
-            percent = int((i / total) * 100)
-            logger.info(f"[{chapter_name}] Downloading: {percent}% ({i}/{total})")
-            try:
-                await progress_callback(i, total, f"⏳ Скачивание: {percent}% ({i}/{total})")
-            except Exception:
-                pass
-        
-        img = await run_sync(download_image, url)
-        if img:
-            images.append(img)
-        else:
-            failed_pages += 1
+    fmt: str,
+    writer: Callable[[list, IO[bytes]], None],
+    prepare: Callable[[str, bytes], Any] | None = None,
+    progress_callback: ProgressCallback | None = None,
+    process_pool_above: int | None = None,
+) -> bytes | str | None:
+    """Download chapter pages and build the file with writer(blobs, stream).
+    
+    Shared by the PDF and CBZ chapter downloads; fmt is "pdf" or "cbz" and is
+    used for the file extension and error log types. The writer runs in the
+    I/O pool, or in the worker process pool once the pages total more than
+    process_pool_above bytes. Returns the file bytes, or a temp file path
+    when the result exceeds IN_MEMORY_FILE_LIMIT.
+    """
+    urls = [url for page in pages if (url := page_url(page))]
+    total = len(urls)
+    results = await _download_pages(urls, chapter_name, progress_callback, prepare)
+    blobs = [blob for blob in results if blob]
+    failed_pages = total - len(blobs)
     
     if progress_callback:
-        logger.info(f"[{chapter_name}] Creating PDF...")
+        logger.info(f"[{chapter_name}] Creating {fmt.upper()}...")
         try:
-            await progress_callback(total, total, "📄 Создаю PDF...")
+            await progress_callback(total, total, _BUILD_STATUS[fmt])
         except Exception:
             pass
     
     if failed_pages > 0:
-        log_error("pdf_download", f"Failed to download {failed_pages} pages", f"chapter={chapter_name}")
+        log_error(f"{fmt}_download", f"Failed to download {failed_pages} pages", f"chapter={chapter_name}")
     
-    if not images:
-        log_error("pdf_create", "No images downloaded", f"chapter={chapter_name}")
+    if not blobs:
+        log_error(f"{fmt}_create", "No images downloaded", f"chapter={chapter_name}")
         return None
     
-    temp_dir = tempfile.gettempdir()
-    safe_name = "".join(c if c.isalnum() or c in "._- " else "_" for c in chapter_name)
-    pdf_path = os.path.join(temp_dir, f"{safe_name}.pdf")
-    
     try:
-        await run_sync(create_pdf_from_images, images, pdf_path)
+        # Shipping pages to a worker process copies them both ways; that only
+        # beats holding the GIL in this process for very large chapters
+        large = process_pool_above is not None and sum(map(len, blobs)) > process_pool_above
+        run = run_cpu if large else run_sync
+        data = await run(_write_to_bytes, writer, blobs)
     except Exception as e:
-        log_error("pdf_create", str(e), f"chapter={chapter_name}")
+        log_error(f"{fmt}_create", str(e), f"chapter={chapter_name}")
         return None
     
-    logger.info(f"[{chapter_name}] PDF created: {os.path.getsize(pdf_path) / (1024*1024):.1f} MB")
-    return pdf_path
+    logger.info(f"[{chapter_name}] {fmt.upper()} created: {len(data) / (1024*1024):.1f} MB")
+    if len(data) <= IN_MEMORY_FILE_LIMIT:
+        return data
+    
+    path = os.path.join(tempfile.gettempdir(), f"{safe_filename(chapter_name)}.{fmt}")
+    try:
+        await run_sync(_write_file, path, data)
+    except Exception as e:
+        log_error(f"{fmt}_create", str(e), f"chapter={chapter_name}")
+        _remove_partial(path)
+        return None
+    return path
+
+
+_BUILD_STATUS = {
+    "pdf": "📄 Создаю PDF...",
+    "cbz": "📦 Создаю CBZ...",
+}
+
+
+async def download_chapter_as_pdf(
+    pages: list[dict], 
+    chapter_name: str,
+    progress_callback: ProgressCallback | None = None
+) -> bytes | str | None:
+    """Download all pages and create PDF. Returns PDF bytes, or a path for large files."""
+    # Non-JPEG pages are converted while the rest are still downloading
+    return await _build_chapter_file(
+        pages, chapter_name, "pdf", create_pdf_from_raw, _page_for_pdf, progress_callback,
+        process_pool_above=PDF_PROCESS_POOL_MIN_BYTES,
+    )
 
 
 async def download_chapter_as_cbz(
     pages: list[dict], 
     chapter_name: str,
     progress_callback: ProgressCallback | None = None
-) -> str | None:
-    """Download all pages and create CBZ (Comic Book ZIP). Returns path to CBZ file."""
-    images: list[Image.Image] = []
-    failed_pages = 0
-    total = len(pages)
-    
-    for i, page in enumerate(pages):
-        url = page.get("img") or page.get("image") or page.get("url")
-        if not url:
-            continue
-        
-        # Report progress
-        if progress_callback and i % 3 == 0:
-            percent = int((i / total) * 100)
-            logger.info(f"[{chapter_name}] Downloading: {percent}% ({i}/{total})")
-            try:
-                await progress_callback(i, total, f"⏳ Скачивание: {percent}% ({i}/{total})")
-            except Exception:
-                pass
-        
-        img = await run_sync(download_image, url)
-        if img:
-            images.append(img)
-        else:
-            failed_pages += 1
-    
-    if progress_callback:
-        logger.info(f"[{chapter_name}] Creating CBZ...")
-        try:
-            await progress_callback(total, total, "📦 Создаю CBZ...")
-        except Exception:
-            pass
-    
-    if failed_pages > 0:
-        log_error("cbz_download", f"Failed to download {failed_pages} pages", f"chapter={chapter_name}")
-    
-    if not images:
-        log_error("cbz_create", "No images downloaded", f"chapter={chapter_name}")
-        return None
-    
-    temp_dir = tempfile.gettempdir()
-    safe_name = "".join(c if c.isalnum() or c in "._- " else "_" for c in chapter_name)
-    cbz_path = os.path.join(temp_dir, f"{safe_name}.cbz")
-    
-    try:
-        await run_sync(create_cbz_from_images, images, cbz_path)
-    except Exception as e:
-        log_error("cbz_create", str(e), f"chapter={chapter_name}")
-        return None
-    
-    return cbz_path
+) -> bytes | str | None:
+    """Download all pages and create CBZ (Comic Book ZIP). Returns CBZ bytes, or a path for large files."""
+    return await _build_chapter_file(
+        pages, chapter_name, "cbz", create_cbz_from_raw, None, progress_callback
+    )
 
 
 # ============== Volume Download Functions ==============
@@ -312,36 +712,17 @@ async def download_volume_as_pdf(
         quality: JPEG quality when compressing (1-100)
         progress_callback: Async callback for progress updates
     """
-    images: list[Image.Image] = []
-    failed_pages = 0
-    total = len(pages)
-    
-    for i, page in enumerate(pages):
-        # Handle both dict and string page formats
-        if isinstance(page, dict):
-            url = page.get("img") or page.get("image") or page.get("url")
-        else:
-            url = page
-        
-        if not url:
-            continue
-        
-        # Report progress
-        if progress_callback and i % 5 == 0:  # Update every 5 pages for volumes
-            percent = int((i / total) * 100)
-            logger.info(f"[{volume_name}] Downloading: {percent}% ({i}/{total})")
-            try:
-                await progress_callback(i, total, f"⏳ Скачивание: {percent}% ({i}/{total})")
-            except Exception:
-                pass
-            
-        img = await run_sync(download_image, url)
-        if img:
-            if compress:
-                img = compress_image_for_volume(img, max_dimension)
-            images.append(img)
-        else:
-            failed_pages += 1
+    # Handle both dict and string page formats
+    urls = [url for page in pages if (url := page_url(page))]
+    total = len(urls)
+    
+    def prepare(content_type: str, body: bytes) -> Image.Image:
+        img = _decode_image(body)
+        return compress_image_for_volume(img, max_dimension) if compress else img
+    
+    results = await _download_pages(urls, volume_name, progress_callback, prepare)
+    images: list[Image.Image] = [img for img in results if img]
+    failed_pages = total - len(images)
     
     if progress_callback:
         logger.info(f"[{volume_name}] Creating PDF...")
@@ -358,8 +739,7 @@ async def download_volume_as_pdf(
         return None
     
     temp_dir = tempfile.gettempdir()
-    safe_name = "".join(c if c.isalnum() or c in "._- " else "_" for c in volume_name)
-    pdf_path = os.path.join(temp_dir, f"{safe_name}.pdf")
+    pdf_path = os.path.join(temp_dir, f"{safe_filename(volume_name)}.pdf")
     
     img_quality = quality if compress else 85
     
@@ -367,58 +747,20 @@ async def download_volume_as_pdf(
         await run_sync(create_pdf_from_images, images, pdf_path, img_quality)
     except Exception as e:
         log_error("volume_pdf_create", str(e), f"volume={volume_name}")
+        _remove_partial(pdf_path)
         return None
     
     return pdf_path
 
 
-def create_cbz_with_chapters(
-    pages_with_info: list[dict], 
-    output_path: str, 
-    quality: int = 85,
-    compress: bool = False,
-    max_dimension: int = 1800
-) -> None:
-    """Create CBZ archive with chapter organization.
+def _write_volume_cbz(pages: list[tuple[str, int, bytes]], output_path: str) -> None:
+    """Write encoded volume pages into a CBZ with a folder per chapter.
     
-    Args:
-        pages_with_info: List of dicts with 'url' and 'chapter' keys
-        output_path: Path for output CBZ file
-        quality: JPEG quality (1-100)
-        compress: If True, resize large images
-        max_dimension: Max image dimension when compressing
+    Pages are JPEG data, which DEFLATE can't shrink, so they are stored.
     """
-    with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as zf:
-        page_count_per_chapter = {}
-        
-        for page_info in pages_with_info:
-            url = page_info.get("url")
-            chapter = page_info.get("chapter", "unknown")
-            
-            if not url:
-                continue
-                
-            img = download_image(url)
-            if not img:
-                continue
-            
-            # Compress if needed
-            if compress:
-                img = compress_image_for_volume(img, max_dimension)
-            
-            # Track page number per chapter
-            if chapter not in page_count_per_chapter:
-                page_count_per_chapter[chapter] = 0
-            page_count_per_chapter[chapter] += 1
-            page_num = page_count_per_chapter[chapter]
-            
-            # Create safe chapter name for folder
-            safe_chapter = "".join(c if c.isalnum() or c in "._- " else "_" for c in str(chapter))
-            
-            img_buffer = io.BytesIO()
-            img.save(img_buffer, format="JPEG", quality=quality)
-            img_buffer.seek(0)
-            zf.writestr(f"{safe_chapter}/page_{page_num:03d}.jpg", img_buffer.read())
+    with open(output_path, "wb", buffering=OUTPUT_BUFFER_SIZE) as f, zipfile.ZipFile(f, 'w', zipfile.ZIP_STORED) as zf:
+        for chapter, page_num, data in pages:
+            zf.writestr(f"{safe_filename(chapter)}/page_{page_num:03d}.jpg", data)
 
 
 async def download_volume_as_cbz(
@@ -444,47 +786,36 @@ async def download_volume_as_cbz(
         return None
     
     temp_dir = tempfile.gettempdir()
-    safe_name = "".join(c if c.isalnum() or c in "._- " else "_" for c in volume_name)
-    cbz_path = os.path.join(temp_dir, f"{safe_name}.cbz")
+    cbz_path = os.path.join(temp_dir, f"{safe_filename(volume_name)}.cbz")
     
     img_quality = quality if compress else 85
-    total = len(pages_with_info)
+    
+    def prepare(content_type: str, body: bytes) -> bytes:
+        """Decode, optionally shrink and re-encode a page while others download."""
+        img = _decode_image(body)
+        if compress:
+            img = compress_image_for_volume(img, max_dimension)
+        img_buffer = io.BytesIO()
+        img.save(img_buffer, format="JPEG", quality=img_quality)
+        return img_buffer.getvalue()
+    
+    entries = [page_info for page_info in pages_with_info if page_info.get("url")]
+    total = len(entries)
     
     try:
-        # Download images with progress tracking
-        downloaded_images: list[tuple[str, int, Image.Image]] = []  # (chapter, page_num, image)
-        page_count_per_chapter: dict[str, int] = {}
+        results = await _download_pages(
+            [page_info["url"] for page_info in entries], volume_name, progress_callback, prepare
+        )
         
-        for i, page_info in enumerate(pages_with_info):
-            url = page_info.get("url")
-            chapter = page_info.get("chapter", "unknown")
-            
-            if not url:
-                continue
-            
-            # Report progress
-            if progress_callback and i % 5 == 0:
-                percent = int((i / total) * 100)
-                logger.info(f"[{volume_name}] Downloading: {percent}% ({i}/{total})")
-                try:
-                    await progress_callback(i, total, f"⏳ Скачивание: {percent}% ({i}/{total})")
-                except Exception:
-                    pass
-            
-            img = await run_sync(download_image, url)
-            if not img:
+        # (chapter, page_num, jpeg bytes); pages are numbered per chapter
+        downloaded_images: list[tuple[str, int, bytes]] = []
+        page_count_per_chapter: dict[str, int] = {}
+        for page_info, data in zip(entries, results):
+            if not data:
                 continue
-            
-            if compress:
-                img = compress_image_for_volume(img, max_dimension)
-            
-            # Track page number per chapter
-            if chapter not in page_count_per_chapter:
-                page_count_per_chapter[chapter] = 0
-            page_count_per_chapter[chapter] += 1
-            page_num = page_count_per_chapter[chapter]
-            
-            downloaded_images.append((str(chapter), page_num, img))
+            chapter = str(page_info.get("chapter", "unknown"))
+            page_count_per_chapter[chapter] = page_num = page_count_per_chapter.get(chapter, 0) + 1
+            downloaded_images.append((chapter, page_num, data))
         
         if progress_callback:
             logger.info(f"[{volume_name}] Creating CBZ...")
@@ -493,17 +824,11 @@ async def download_volume_as_cbz(
             except Exception:
                 pass
         
-        # Create CBZ from downloaded images
-        with zipfile.ZipFile(cbz_path, 'w', zipfile.ZIP_DEFLATED) as zf:
-            for chapter, page_num, img in downloaded_images:
-                safe_chapter = "".join(c if c.isalnum() or c in "._- " else "_" for c in chapter)
-                img_buffer = io.BytesIO()
-                img.save(img_buffer, format="JPEG", quality=img_quality)
-                img_buffer.seek(0)
-                zf.writestr(f"{safe_chapter}/page_{page_num:03d}.jpg", img_buffer.read())
+        await run_sync(_write_volume_cbz, downloaded_images, cbz_path)
                 
     except Exception as e:
         log_error("volume_cbz_create", str(e), f"volume={volume_name}")
+        _remove_partial(cbz_path)
         return None
     
     # Check if file was created and has content